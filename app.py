@@ -1,16 +1,15 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import os
-import time
-from datetime import datetime
-import requests
-from bs4 import BeautifulSoup
-import re
 import logging
-from typing import List, Dict, Optional
-from urllib.parse import urljoin
+from typing import Optional
+from deduplicacion import locality_token
+from geocodificacion import PRECISION_STREET, Geocoder, hex_bins
+from datos_compartidos import SharedDataset, clean_data
+from estadisticas import MarketStats, property_type
+from busquedas_guardadas import SavedSearch, SavedSearchMatcher
+
+# El scraper (requests/bs4), plotly y pydeck se importan recién cuando se
+# usan, para que el primer render después de reiniciar el dyno sea rápido
 
 # Configurar página
 st.set_page_config(
@@ -24,207 +23,125 @@ st.set_page_config(
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class MercadoLibreInmueblesScraper:
-    """Scraper optimizado para inmuebles de MercadoLibre Argentina"""
-    
-    def __init__(self, min_price: str = "200000", max_price: str = "800000", delay: float = 1.0):
-        self.min_price = min_price
-        self.max_price = max_price
-        self.delay = delay
-        self.base_url = "https://inmuebles.mercadolibre.com.ar"
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
-        
-    def get_soup(self, url: str) -> Optional[BeautifulSoup]:
-        try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            return BeautifulSoup(response.text, 'html.parser')
-        except requests.RequestException as e:
-            logger.error(f"Error al obtener la página {url}: {e}")
-            return None
-    
-    def extract_meters(self, item) -> Optional[float]:
-        """
-        Extrae los metros cuadrados del inmueble
-        """
-        try:
-            # Buscar en los atributos de la lista
-            attributes = item.find_all('li', {'class': 'poly-attributes-list__bar'})
-            for attr in attributes:
-                text = attr.get_text(strip=True)
-                if 'm² cubiertos' in text or 'm²' in text:
-                    meters_match = re.search(r'(\d+(?:\.\d+)?)', text)
-                    if meters_match:
-                        return float(meters_match.group(1))
-            
-            # Buscar en otros posibles contenedores
-            attributes_alt = item.find_all('li', {'class': 'poly-attributes_list__item'})
-            for attr in attributes_alt:
-                text = attr.get_text(strip=True)
-                if 'm²' in text:
-                    meters_match = re.search(r'(\d+(?:\.\d+)?)', text)
-                    if meters_match:
-                        return float(meters_match.group(1))
-                        
-        except Exception as e:
-            logger.warning(f"Error extrayendo metros: {e}")
-        
-        return None
-    
-    def extract_product_data(self, item, index: int) -> Optional[Dict]:
-        try:
-            # Título
-            title_elem = item.find('h3', {'class': 'poly-component__title-wrapper'})
-            if not title_elem:
-                title_elem = item.find('h2', {'class': 'poly-component__title'})
-            title = title_elem.get_text(strip=True) if title_elem else "Sin título"
-            
-            # Moneda
-            currency_elem = item.find('span', {'class': 'andes-money-amount__currency-symbol'})
-            currency = currency_elem.get_text(strip=True) if currency_elem else "USD"
-            
-            # Precio
-            price_elem = item.find('span', {'class': 'andes-money-amount__fraction'})
-            price = 0
-            if price_elem:
-                price_text = price_elem.get_text(strip=True).replace('.', '').replace(',', '')
-                try:
-                    price = int(price_text)
-                except ValueError:
-                    price = 0
-            
-            # Ubicación
-            location_elem = item.find('span', {'class': 'poly-component__location'})
-            location = location_elem.get_text(strip=True) if location_elem else "Sin ubicación"
-            
-            # Metros cuadrados
-            meters = self.extract_meters(item)
-            
-            # Imagen
-            img = item.find('img')
-            image_url = ""
-            if img:
-                image_url = img.get('data-src') or img.get('src') or ""
-            
-            # Link
-            link_elem = item.find('a')
-            link = ""
-            if link_elem and link_elem.get('href'):
-                link = urljoin(self.base_url, link_elem['href'])
-            
-            return {
-                'ID': index,
-                'title': title,
-                'currency': currency,
-                'price': price,
-                'location': location,
-                'meters': meters if meters else 0,
-                'image': image_url,
-                'links': link
-            }
-            
-        except Exception as e:
-            logger.error(f"Error extrayendo datos del producto {index}: {e}")
-            return None
-    
-    def scrape_page(self, url: str, start_index: int) -> List[Dict]:
-        products = []
-        soup = self.get_soup(url)
-        
-        if not soup:
-            return products
-            
-        results = soup.find_all('div', {'class': 'andes-card'})
-        
-        for i, item in enumerate(results):
-            product = self.extract_product_data(item, start_index + i + 1)
-            if product:
-                products.append(product)
-        
-        return products
-    
-    def run_scraper(self, max_pages: int = 10):
-        """Ejecuta el scraping y retorna lista de productos"""
-        all_products = []
-        
-        # Primera página
-        url = f"{self.base_url}/venta/_PriceRange_{self.min_price}USD-{self.max_price}USD"
-        products = self.scrape_page(url, 0)
-        all_products.extend(products)
-        
-        # Páginas adicionales
-        for page in range(1, max_pages):
-            offset = page * 48
-            url = f"{self.base_url}/venta/_Desde_{offset + 1}_PriceRange_{self.min_price}USD-{self.max_price}USD"
-            products = self.scrape_page(url, len(all_products))
-            
-            if not products:
-                break
-                
-            all_products.extend(products)
-            time.sleep(self.delay)
-        
-        return all_products
-
 # Funciones auxiliares
-@st.cache_data(ttl=3600)  # Cache por 1 hora
-def load_data_from_csv(filename: str):
-    """Carga datos desde CSV con cache"""
-    try:
-        if os.path.exists(filename):
-            df = pd.read_csv(filename)
-            return df
-        return None
-    except Exception as e:
-        st.error(f"Error cargando CSV: {e}")
-        return None
-
-def clean_data(df: pd.DataFrame) -> pd.DataFrame:
-    """Limpia y procesa los datos del DataFrame"""
-    df = df.copy()
-    
-    # Limpiar y convertir precio
-    df['price'] = pd.to_numeric(df['price'], errors='coerce').fillna(0)
-    df['price'] = df['price'].astype(int)
-    
-    # Limpiar y convertir metros
-    df['meters'] = pd.to_numeric(df['meters'], errors='coerce').fillna(0)
-    
-    # Limpiar otros campos
-    df['currency'] = df['currency'].fillna('USD')
-    df['image'] = df['image'].fillna('')
-    df['links'] = df['links'].fillna('')
-    df['location'] = df['location'].fillna('Sin ubicación')
-    df['title'] = df['title'].fillna('Sin título')
-    
-    return df
-
 def scrape_fresh_data(min_price: str, max_price: str) -> pd.DataFrame:
     """Realiza scraping y retorna DataFrame"""
+    from scraper_inmuebles import MercadoLibreInmueblesScraper
+    from enriquecimiento import DetailEnricher
+    from snapshot import build_snapshot
+    
     scraper = MercadoLibreInmueblesScraper(min_price=min_price, max_price=max_price)
     
     with st.spinner('🔍 Scrapeando datos de MercadoLibre...'):
         products = scraper.run_scraper(max_pages=8)
     
     if products:
-        df = pd.DataFrame(products)
+        df = products.to_dataframe()
         df = clean_data(df)
+        # Completar metraje, ambientes y dormitorios desde las páginas de detalle
+        with st.spinner('🔎 Completando datos desde las páginas de detalle...'):
+            df = DetailEnricher(scraper).enrich(df)
         # Guardar en CSV
         filename = f"inmuebles_{min_price}-{max_price}_output.csv"
         df.to_csv(filename, index=False, encoding='utf-8')
+        build_snapshot(filename, geocoder=get_geocoder())
         st.success(f"✅ {len(products)} inmuebles encontrados!")
+        
+        # Alertar coincidencias con las búsquedas guardadas
+        matches = get_saved_searches().process(df)
+        if matches:
+            st.info(f"🔔 {len(matches)} inmuebles nuevos coinciden con búsquedas guardadas")
         return df
     else:
         st.error("❌ No se pudieron obtener datos")
         return pd.DataFrame()
 
-def create_image_html(image_url: str) -> str:
-    """Crea HTML para mostrar imagen"""
+@st.cache_resource
+def get_geocoder() -> Geocoder:
+    """Geocodificador compartido entre sesiones (con su cache en disco)"""
+    return Geocoder()
+
+@st.cache_resource(ttl=3600)  # Cache por 1 hora
+def get_shared_dataset(filename: str) -> Optional[SharedDataset]:
+    """
+    Dataset compartido por todas las sesiones: se carga una vez por proceso
+    y las sesiones lo filtran sin copiarlo
+    """
+    try:
+        dataset = SharedDataset.from_file(filename, get_geocoder())
+    except Exception as e:
+        st.error(f"Error cargando datos: {e}")
+        return None
+    if dataset is not None:
+        # Actualizar estadísticas de mercado con una fila por propiedad (las
+        # copias publicadas por otras fuentes no se cuentan)
+        columns = ['links', 'title', 'location', 'currency', 'price', 'meters']
+        canonical = dataset.table.filter(dataset.table.column('canonical'))
+        get_market_stats().update(canonical.select(columns).to_pandas())
+    return dataset
+
+def create_hex_map(df: pd.DataFrame, radius_km: float = 0.5):
+    """Crea un mapa pydeck (o None) con las propiedades agregadas en hexágonos"""
+    import pydeck as pdk
+    
+    df_geo = df[df['lat'].notna() & (df['price'] > 0)]
+    if df_geo.empty:
+        return None
+    bins = pd.DataFrame(hex_bins(
+        df_geo['lat'].tolist(), df_geo['lon'].tolist(), df_geo['price'].tolist(), radius_km
+    ))
+    max_count = bins['count'].max()
+    bins['color'] = bins['count'].apply(
+        lambda c: [0, 212, 255, int(80 + 175 * c / max_count)]
+    )
+    bins['mean_price'] = bins['mean_value'].apply(lambda v: f"{v:,.0f}")
+    layer = pdk.Layer(
+        "ColumnLayer",
+        data=bins,
+        get_position=['lon', 'lat'],
+        get_elevation='count',
+        elevation_scale=100,
+        radius=radius_km * 1000,
+        disk_resolution=6,
+        get_fill_color='color',
+        extruded=True,
+        pickable=True,
+    )
+    view_state = pdk.ViewState(
+        latitude=float(df_geo['lat'].mean()),
+        longitude=float(df_geo['lon'].mean()),
+        zoom=10,
+        pitch=40,
+    )
+    return pdk.Deck(
+        layers=[layer],
+        initial_view_state=view_state,
+        tooltip={"text": "{count} propiedades\nPrecio promedio: ${mean_price}"},
+    )
+
+@st.cache_resource
+def get_market_stats() -> MarketStats:
+    """Estadísticas de mercado compartidas entre sesiones"""
+    return MarketStats()
+
+@st.cache_resource
+def get_saved_searches() -> SavedSearchMatcher:
+    """Búsquedas guardadas compartidas entre sesiones"""
+    return SavedSearchMatcher(geocoder=get_geocoder())
+
+@st.cache_resource
+def get_thumbnail_cache():
+    """Proxy de miniaturas compartido entre sesiones"""
+    from miniaturas import ThumbnailCache
+    return ThumbnailCache()
+
+def create_image_html(image_url: str, thumbnails: Optional[dict] = None) -> str:
+    """Crea HTML para mostrar imagen (la miniatura local si está disponible)"""
     if not image_url or image_url.startswith('data:'):
         return "📷 Sin imagen"
+    if thumbnails and image_url in thumbnails:
+        from miniaturas import thumbnail_data_uri
+        image_url = thumbnail_data_uri(thumbnails[image_url])
     return f'<img src="{image_url}" style="max-height:100px;max-width:150px;border-radius:8px;" alt="Property">'
 
 def create_link_html(url: str, text: str = "Ver propiedad") -> str:
@@ -233,6 +150,15 @@ def create_link_html(url: str, text: str = "Ver propiedad") -> str:
         return "Sin enlace"
     return f'<a href="{url}" target="_blank" style="color:#1f77b4;text-decoration:none;font-weight:bold;">🔗 {text}</a>'
 
+def create_sources_html(sources) -> str:
+    """Crea HTML con los enlaces de todas las publicaciones de una propiedad"""
+    sources = [] if sources is None else list(sources)
+    if len(sources) <= 1:
+        return create_link_html(sources[0] if sources else "")
+    return "<br>".join(
+        create_link_html(url, f"Fuente {i + 1}") for i, url in enumerate(sources)
+    )
+
 def format_price(price: int, currency: str) -> str:
     """Formatea precio con moneda"""
     return f"{currency} ${price:,.0f}"
@@ -284,62 +210,60 @@ def main():
             load_existing = st.button("📁 Cargar Existente")
     
     # Manejo de datos
-    df = None
     filename = f"inmuebles_{min_price}-{max_price}_output.csv"
     
     if scrape_new:
-        df = scrape_fresh_data(min_price, max_price)
-    elif load_existing:
-        df = load_data_from_csv(filename)
-        if df is None:
-            st.warning("⚠️ No se encontró archivo existente. Ejecutando scraping...")
-            df = scrape_fresh_data(min_price, max_price)
-        else:
-            df = clean_data(df)
-    else:
-        # Cargar datos existentes si existen
-        df = load_data_from_csv(filename)
-        if df is not None:
-            df = clean_data(df)
+        if not scrape_fresh_data(min_price, max_price).empty:
+            get_shared_dataset.clear()
+    elif load_existing and get_shared_dataset(filename) is None:
+        st.warning("⚠️ No se encontró archivo existente. Ejecutando scraping...")
+        if not scrape_fresh_data(min_price, max_price).empty:
+            get_shared_dataset.clear()
     
-    if df is None or df.empty:
+    # Cargar datos existentes si existen
+    dataset = get_shared_dataset(filename)
+    if dataset is None:
         st.info("👆 Selecciona una opción en el sidebar para comenzar")
         return
     
+    market_stats = get_market_stats()
+    
     # Sidebar - Filtros
     with st.sidebar:
         st.markdown("---")
         st.subheader("🎛️ Filtros")
         
+        # Agrupar la misma propiedad publicada por distintas fuentes
+        group_duplicates = st.checkbox("🧬 Agrupar publicaciones duplicadas", value=True)
+        
         # Filtro de moneda
-        currencies = df['currency'].unique()
-        selected_currency = st.selectbox("💰 Moneda:", currencies)
+        selected_currency = st.selectbox("💰 Moneda:", dataset.currencies)
         
         # Filtro de precio (solo para propiedades con precio > 0)
-        df_with_price = df[df['price'] > 0]
-        if len(df_with_price) > 0 and df_with_price['price'].max() > df_with_price['price'].min():
+        prices = dataset.price[dataset.price > 0]
+        if len(prices) > 0 and prices.max() > prices.min():
             price_range = st.slider(
                 "💵 Rango de Precios:",
-                int(df_with_price['price'].min()),
-                int(df_with_price['price'].max()),
-                (int(df_with_price['price'].min()), int(df_with_price['price'].max())),
+                int(prices.min()),
+                int(prices.max()),
+                (int(prices.min()), int(prices.max())),
                 step=5000
             )
         else:
-            price_range = (0, df['price'].max() if len(df) > 0 else 1000000)
+            price_range = (0, dataset.price.max() if len(dataset) > 0 else 1000000)
         
         # Filtro de metraje (solo para propiedades con metraje > 0)
-        df_with_meters = df[df['meters'] > 0]
-        if len(df_with_meters) > 0 and df_with_meters['meters'].max() > df_with_meters['meters'].min():
+        meters = dataset.meters[dataset.meters > 0]
+        if len(meters) > 0 and meters.max() > meters.min():
             meters_range = st.slider(
                 "📐 Metraje (m²):",
-                int(df_with_meters['meters'].min()),
-                int(df_with_meters['meters'].max()),
-                (int(df_with_meters['meters'].min()), int(df_with_meters['meters'].max())),
+                int(meters.min()),
+                int(meters.max()),
+                (int(meters.min()), int(meters.max())),
                 step=5
             )
         else:
-            meters_range = (0, df['meters'].max() if len(df) > 0 else 1000)
+            meters_range = (0, dataset.meters.max() if len(dataset) > 0 else 1000)
         
         # Checkbox para incluir propiedades sin metraje
         include_no_meters = st.checkbox("Incluir propiedades sin metraje especificado", value=True)
@@ -347,30 +271,66 @@ def main():
         # Filtros de texto
         location_filter = st.text_input("📍 Ubicación contiene:", placeholder="Ej: Palermo")
         title_filter = st.text_input("🏠 Descripción contiene:", placeholder="Ej: departamento")
+        
+        # Filtro por distancia
+        street_level = bool(get_geocoder().streets)
+        near_filter = st.text_input(
+            "🧭 Cerca de:",
+            placeholder="Ej: Saavedra o Machaín 4146, Saavedra" if street_level else "Ej: Saavedra o Tigre"
+        )
+        radius_km = st.slider("📏 Radio (km):", 1, 30, 3)
+        if not street_level:
+            # Sin gazetteer de calles todo se ubica en el centro del barrio/partido
+            st.caption("ℹ️ Ubicaciones a nivel barrio/partido: el radio es aproximado")
+        center = None
+        if near_filter:
+            center = get_geocoder().geocode(near_filter)
+            if not center:
+                st.warning("⚠️ No se pudo ubicar la dirección indicada")
+            elif center[2] != PRECISION_STREET:
+                st.caption(f"📍 Ubicada a nivel {center[2]}")
+        
+        # Búsquedas guardadas
+        st.markdown("---")
+        st.subheader("🔔 Búsquedas Guardadas")
+        saved_searches = get_saved_searches()
+        search_name = st.text_input("Nombre de la búsqueda", placeholder="Ej: PH en Saavedra")
+        if st.button("💾 Guardar búsqueda") and search_name:
+            saved_searches.add(SavedSearch(
+                name=search_name,
+                currency=selected_currency,
+                min_price=float(price_range[0]),
+                max_price=float(price_range[1]),
+                min_meters=float(meters_range[0]),
+                max_meters=float(meters_range[1]),
+                include_no_meters=include_no_meters,
+                location=location_filter,
+                title=title_filter,
+                near_lat=center[0] if center else None,
+                near_lon=center[1] if center else None,
+                radius_km=float(radius_km) if center else None,
+            ))
+            st.success(f"✅ Búsqueda '{search_name}' guardada")
+        for search in list(saved_searches.searches.values()):
+            col1, col2 = st.columns([4, 1])
+            col1.caption(f"{search.name} (≤ {search.radius_km:.0f} km)" if search.has_near else search.name)
+            if col2.button("🗑️", key=f"delete_search_{search.search_id}"):
+                saved_searches.remove(search.search_id)
+                st.rerun()
     
-    # Aplicar filtros
-    df_filtered = df[
-        (df['currency'] == selected_currency) &
-        (df['price'] >= price_range[0]) &
-        (df['price'] <= price_range[1])
-    ]
-    
-    # Filtro de metraje
-    if include_no_meters:
-        df_filtered = df_filtered[
-            ((df_filtered['meters'] >= meters_range[0]) & (df_filtered['meters'] <= meters_range[1])) |
-            (df_filtered['meters'] == 0)
-        ]
-    else:
-        df_filtered = df_filtered[
-            (df_filtered['meters'] >= meters_range[0]) & (df_filtered['meters'] <= meters_range[1]) & (df_filtered['meters'] > 0)
-        ]
-    
-    if location_filter:
-        df_filtered = df_filtered[df_filtered['location'].str.contains(location_filter, case=False, na=False)]
-    
-    if title_filter:
-        df_filtered = df_filtered[df_filtered['title'].str.contains(title_filter, case=False, na=False)]
+    # Aplicar filtros sobre el dataset compartido (solo se copian las filas a mostrar)
+    positions = dataset.filter(
+        selected_currency,
+        price_range,
+        meters_range,
+        include_no_meters=include_no_meters,
+        location=location_filter,
+        title=title_filter,
+        group_duplicates=group_duplicates,
+        near=center[:2] if center else None,
+        radius_km=radius_km,
+    )
+    df_filtered = dataset.view(positions)
     
     # Métricas principales
     if not df_filtered.empty:
@@ -408,6 +368,8 @@ def main():
     
     # Gráficos
     if not df_filtered.empty and len(df_filtered) > 1:
+        import plotly.express as px
+        
         st.markdown("---")
         
         col1, col2 = st.columns(2)
@@ -455,25 +417,59 @@ def main():
             else:
                 st.info("No hay suficientes datos de metraje y precio para mostrar")
     
+    # Tendencia de precio/m² por barrio y tipo
+    df_complete = df_filtered[(df_filtered['price'] > 0) & (df_filtered['meters'] > 0)]
+    if not df_complete.empty:
+        groups = pd.Series(list(zip(
+            df_complete['location'].apply(locality_token),
+            df_complete['title'].apply(property_type),
+            df_complete['currency']
+        ))).value_counts().index.tolist()
+        st.markdown("---")
+        st.subheader("📈 Tendencia Precio/m²")
+        selected_group = st.selectbox(
+            "Barrio y tipo:", groups, format_func=lambda g: f"{g[0].title()} - {g[1]} ({g[2]})"
+        )
+        summary = market_stats.summary(*selected_group)
+        if summary:
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Mediana", format_price(summary['median'], selected_group[2]))
+            col2.metric("P90", format_price(summary['p90'], selected_group[2]))
+            col3.metric("Publicaciones", summary['count'])
+        trend = market_stats.trend(*selected_group)
+        if len(trend) > 1:
+            st.line_chart(trend.set_index('date')[['mean', 'median', 'p90']])
+    
+    # Mapa
+    if not df_filtered.empty:
+        deck = create_hex_map(df_filtered)
+        if deck is not None:
+            st.markdown("---")
+            st.subheader("🗺️ Mapa de Propiedades")
+            st.pydeck_chart(deck)
+    
     # Tabla de resultados
     st.markdown("---")
     st.subheader(f"🏠 Propiedades Encontradas ({len(df_filtered)})")
     
     if not df_filtered.empty:
         # Preparar datos para mostrar
-        display_df = df_filtered.copy()
-        display_df = display_df.sort_values('price', ascending=False)
+        display_df = df_filtered.sort_values('price', ascending=False)
         
         # Formatear columnas
         display_df['Precio'] = display_df.apply(lambda x: format_price(x['price'], x['currency']) if x['price'] > 0 else "Consultar", axis=1)
-        display_df['Imagen'] = display_df['image'].apply(create_image_html)
-        display_df['Enlace'] = display_df['links'].apply(create_link_html)
+        thumbnails = get_thumbnail_cache().get_many(display_df['image'])
+        display_df['Imagen'] = display_df['image'].apply(lambda url: create_image_html(url, thumbnails))
+        display_df['Enlace'] = display_df['sources'].apply(create_sources_html)
         display_df['Metraje'] = display_df['meters'].apply(lambda x: f"{x:.0f} m²" if x > 0 else "No especificado")
+        display_df['Percentil'] = display_df.apply(
+            lambda x: market_stats.percentile_rank(x['location'], x['title'], x['currency'], x['price'], x['meters']), axis=1
+        ).apply(lambda p: f"P{p:.0f}" if pd.notna(p) else "-")
         
         # Seleccionar columnas para mostrar
-        columns_to_show = ['title', 'location', 'Precio', 'Metraje', 'Imagen', 'Enlace']
+        columns_to_show = ['title', 'location', 'Precio', 'Metraje', 'Percentil', 'Imagen', 'Enlace']
         final_df = display_df[columns_to_show]
-        final_df.columns = ['🏠 Título', '📍 Ubicación', '💰 Precio', '📐 Metraje', '📷 Imagen', '🔗 Link']
+        final_df.columns = ['🏠 Título', '📍 Ubicación', '💰 Precio', '📐 Metraje', '📊 Percentil m²', '📷 Imagen', '🔗 Link']
         
         # Mostrar tabla con HTML
         st.markdown(
@@ -0,0 +1,323 @@
+import json
+import math
+import os
+import threading
+import uuid
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from deduplicacion import listing_key, normalize_text
+from geocodificacion import Geocoder, haversine_km
+
+logger = logging.getLogger(__name__)
+
+SAVED_SEARCHES_FILE = "saved_searches.json"
+OUTBOX_FILE = "alertas_outbox.jsonl"
+
+
+def trigrams(text: str) -> Set[str]:
+    """Trigramas de caracteres de un texto ya normalizado"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SavedSearch:
+    """
+    Búsqueda guardada con los mismos criterios que los filtros del sidebar
+    """
+
+    __slots__ = ('search_id', 'name', 'currency', 'min_price', 'max_price', 'min_meters',
+                 'max_meters', 'include_no_meters', 'location', 'title',
+                 'near_lat', 'near_lon', 'radius_km')
+
+    def __init__(self, name: str, currency: Optional[str] = None,
+                 min_price: float = 0, max_price: float = math.inf,
+                 min_meters: float = 0, max_meters: float = math.inf,
+                 include_no_meters: bool = True, location: str = "", title: str = "",
+                 near_lat: Optional[float] = None, near_lon: Optional[float] = None,
+                 radius_km: Optional[float] = None, search_id: Optional[str] = None):
+        self.search_id = search_id or uuid.uuid4().hex[:12]
+        self.name = name
+        self.currency = currency
+        self.min_price = min_price
+        self.max_price = max_price
+        self.min_meters = min_meters
+        self.max_meters = max_meters
+        self.include_no_meters = include_no_meters
+        self.location = location or ""
+        self.title = title or ""
+        # Filtro "Cerca de": centro ya geocodificado y radio
+        self.near_lat = near_lat
+        self.near_lon = near_lon
+        self.radius_km = radius_km
+
+    @property
+    def has_near(self) -> bool:
+        return self.near_lat is not None and self.near_lon is not None and self.radius_km is not None
+
+    def matches(self, listing: Dict) -> bool:
+        """Aplica los criterios completos (igual que los filtros del dashboard)"""
+        if self.currency and listing.get('currency') != self.currency:
+            return False
+        price = listing.get('price') or 0
+        if not self.min_price <= price <= self.max_price:
+            return False
+        meters = listing.get('meters') or 0
+        if meters == 0:
+            if not self.include_no_meters:
+                return False
+        elif not self.min_meters <= meters <= self.max_meters:
+            return False
+        if self.location and normalize_text(self.location) not in normalize_text(listing.get('location')):
+            return False
+        if self.title and normalize_text(self.title) not in normalize_text(listing.get('title')):
+            return False
+        if self.has_near:
+            lat, lon = listing.get('lat'), listing.get('lon')
+            if lat is None or lon is None or lat != lat or lon != lon:
+                return False
+            if haversine_km(self.near_lat, self.near_lon, lat, lon) > self.radius_km:
+                return False
+        return True
+
+    def to_dict(self) -> Dict:
+        data = {name: getattr(self, name) for name in self.__slots__}
+        # JSON no admite infinito
+        for name in ('max_price', 'max_meters'):
+            if math.isinf(data[name]):
+                data[name] = None
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SavedSearch':
+        data = dict(data)
+        for name in ('max_price', 'max_meters'):
+            if data.get(name) is None:
+                data[name] = math.inf
+        return cls(**data)
+
+
+class _IntervalNode:
+    __slots__ = ('center', 'by_start', 'by_end', 'left', 'right')
+
+
+class IntervalTree:
+    """
+    Árbol de intervalos centrado (estático) para consultas de punto: retorna
+    los ids cuyos intervalos [inicio, fin] contienen un valor en
+    O(log n + k)
+    """
+
+    def __init__(self, intervals: Iterable[Tuple[float, float, str]]):
+        self.root = self._build(list(intervals))
+
+    def _build(self, intervals: List[Tuple[float, float, str]]) -> Optional[_IntervalNode]:
+        if not intervals:
+            return None
+        endpoints = sorted(
+            e for start, end, _ in intervals for e in (start, end) if not math.isinf(e)
+        )
+        center = endpoints[len(endpoints) // 2] if endpoints else 0.0
+
+        left, right, overlapping = [], [], []
+        for interval in intervals:
+            start, end, _ = interval
+            if end < center:
+                left.append(interval)
+            elif start > center:
+                right.append(interval)
+            else:
+                overlapping.append(interval)
+
+        node = _IntervalNode()
+        node.center = center
+        node.by_start = sorted(overlapping, key=lambda i: i[0])
+        node.by_end = sorted(overlapping, key=lambda i: i[1], reverse=True)
+        node.left = self._build(left)
+        node.right = self._build(right)
+        return node
+
+    def stab(self, value: float) -> Set[str]:
+        result = set()
+        node = self.root
+        while node is not None:
+            if value < node.center:
+                for start, _, item in node.by_start:
+                    if start > value:
+                        break
+                    result.add(item)
+                node = node.left
+            elif value > node.center:
+                for _, end, item in node.by_end:
+                    if end < value:
+                        break
+                    result.add(item)
+                node = node.right
+            else:
+                result.update(item for _, _, item in node.by_start)
+                break
+        return result
+
+
+class FileOutbox:
+    """Sink de alertas: agrega una línea JSON por coincidencia a un archivo"""
+
+    def __init__(self, filename: str = OUTBOX_FILE):
+        self.filename = filename
+        self._lock = threading.Lock()
+
+    def send(self, search: SavedSearch, listing: Dict):
+        record = {
+            'search_id': search.search_id,
+            'search_name': search.name,
+            'matched_at': datetime.now().isoformat(timespec='seconds'),
+            'listing': {k: listing.get(k) for k in ('ID', 'title', 'currency', 'price',
+                                                     'location', 'meters', 'links')},
+        }
+        with self._lock:
+            with open(self.filename, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+
+
+class SavedSearchMatcher:
+    """
+    Busca coincidencias de publicaciones nuevas con las búsquedas guardadas.
+
+    Las búsquedas se indexan por intervalo de precio, intervalo de metraje y
+    un trigrama de la ubicación, así que cada publicación solo se compara
+    con las búsquedas candidatas y no con todas.
+    """
+
+    def __init__(self, searches_file: Optional[str] = SAVED_SEARCHES_FILE,
+                 outbox: Optional[FileOutbox] = None, geocoder: Optional[Geocoder] = None):
+        self.searches_file = searches_file
+        self.outbox = outbox or FileOutbox()
+        self.geocoder = geocoder
+        self.searches: Dict[str, SavedSearch] = {}
+        self.notified: Dict[str, Set[str]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self._index = None
+        self._load()
+
+    def _load(self):
+        if not self.searches_file or not os.path.exists(self.searches_file):
+            return
+        try:
+            with open(self.searches_file, encoding='utf-8') as f:
+                data = json.load(f)
+            for item in data['searches']:
+                search = SavedSearch.from_dict(item)
+                self.searches[search.search_id] = search
+            for search_id, keys in data.get('notified', {}).items():
+                self.notified[search_id] = set(keys)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Error cargando búsquedas guardadas: {e}")
+
+    def save(self):
+        if not self.searches_file:
+            return
+        data = {
+            'searches': [s.to_dict() for s in self.searches.values()],
+            'notified': {k: sorted(v) for k, v in self.notified.items() if k in self.searches},
+        }
+        tmp_file = f"{self.searches_file}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_file, self.searches_file)
+        except OSError as e:
+            logger.warning(f"Error guardando búsquedas guardadas: {e}")
+
+    def add(self, search: SavedSearch) -> SavedSearch:
+        with self._lock:
+            self.searches[search.search_id] = search
+            self._index = None
+            self.save()
+        return search
+
+    def remove(self, search_id: str):
+        with self._lock:
+            self.searches.pop(search_id, None)
+            self.notified.pop(search_id, None)
+            self._index = None
+            self.save()
+
+    def _build_index(self):
+        """Reconstruye los índices (solo cuando cambian las búsquedas)"""
+        price_tree = IntervalTree(
+            (s.min_price, s.max_price, s.search_id) for s in self.searches.values()
+        )
+        meters_tree = IntervalTree(
+            (s.min_meters, s.max_meters, s.search_id) for s in self.searches.values()
+        )
+        no_meters = {s.search_id for s in self.searches.values() if s.include_no_meters}
+        # La ubicación se compara como substring ("palerm" coincide con
+        # Palermo), así que cada búsqueda se indexa por uno de sus trigramas:
+        # el que menos búsquedas comparten. Las de menos de tres caracteres
+        # son candidatas siempre.
+        search_trigrams = {s.search_id: trigrams(normalize_text(s.location)) for s in self.searches.values()}
+        frequency = defaultdict(int)
+        for grams in search_trigrams.values():
+            for gram in grams:
+                frequency[gram] += 1
+        by_trigram = defaultdict(set)
+        any_location = set()
+        for search_id, grams in search_trigrams.items():
+            if grams:
+                by_trigram[min(sorted(grams), key=frequency.__getitem__)].add(search_id)
+            else:
+                any_location.add(search_id)
+        self._index = (price_tree, meters_tree, no_meters, by_trigram, any_location)
+
+    def candidates(self, listing: Dict) -> Set[str]:
+        """Búsquedas que podrían coincidir con una publicación"""
+        if self._index is None:
+            self._build_index()
+        price_tree, meters_tree, no_meters, by_trigram, any_location = self._index
+
+        location_ids = set(any_location)
+        for gram in trigrams(normalize_text(listing.get('location'))):
+            location_ids |= by_trigram.get(gram, set())
+        if not location_ids:
+            return set()
+
+        meters = listing.get('meters') or 0
+        meters_ids = no_meters if meters == 0 else meters_tree.stab(meters)
+        candidate_ids = location_ids & meters_ids
+        if not candidate_ids:
+            return set()
+        return candidate_ids & price_tree.stab(listing.get('price') or 0)
+
+    def process(self, df: pd.DataFrame) -> List[Tuple[SavedSearch, Dict]]:
+        """
+        Compara un lote de publicaciones con las búsquedas guardadas y manda
+        al outbox cada coincidencia que no se haya notificado antes
+        """
+        matches = []
+        with self._lock:
+            if not self.searches:
+                return matches
+            records = df.to_dict('records')
+            if 'lat' not in df.columns and any(s.has_near for s in self.searches.values()):
+                # Las búsquedas con "Cerca de" necesitan ubicar las publicaciones
+                self.geocoder = self.geocoder or Geocoder()
+                for listing in records:
+                    result = self.geocoder.geocode(listing.get('location'))
+                    listing['lat'], listing['lon'] = result[:2] if result else (None, None)
+            for listing in records:
+                key = listing_key(listing)
+                for search_id in self.candidates(listing):
+                    if key in self.notified[search_id]:
+                        continue
+                    search = self.searches[search_id]
+                    if search.matches(listing):
+                        self.notified[search_id].add(key)
+                        self.outbox.send(search, listing)
+                        matches.append((search, listing))
+            if matches:
+                self.save()
+        logger.info(f"Búsquedas guardadas: {len(matches)} coincidencias nuevas")
+        return matches
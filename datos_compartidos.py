@@ -0,0 +1,181 @@
+import os
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from deduplicacion import deduplicate_dataframe
+from geocodificacion import Geocoder, SpatialGridIndex
+from snapshot import build_snapshot, listings_table, load_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+def clean_data(df: pd.DataFrame) -> pd.DataFrame:
+    """Limpia y procesa los datos del DataFrame"""
+    df = df.copy()
+
+    # Limpiar y convertir precio
+    df['price'] = pd.to_numeric(df['price'], errors='coerce').fillna(0)
+    df['price'] = df['price'].astype(int)
+
+    # Limpiar y convertir metros
+    df['meters'] = pd.to_numeric(df['meters'], errors='coerce').fillna(0)
+
+    # Limpiar otros campos
+    df['currency'] = df['currency'].fillna('USD')
+    df['image'] = df['image'].fillna('')
+    df['links'] = df['links'].fillna('')
+    df['location'] = df['location'].fillna('Sin ubicación')
+    df['title'] = df['title'].fillna('Sin título')
+
+    return df
+
+
+def prepare_listings(df: pd.DataFrame, geocoder: Optional[Geocoder] = None) -> pd.DataFrame:
+    """
+    Limpia, geocodifica y agrupa duplicados. Se corre al generar el snapshot,
+    así el dashboard no repite este trabajo al cargar los datos.
+
+    Agrega las columnas lat, lon, geo_precision, canonical (fila que
+    representa a su cluster de duplicados), sources y duplicates.
+    """
+    frame = clean_data(df).reset_index(drop=True)
+    frame = (geocoder or Geocoder()).geocode_dataframe(frame)
+    frame['lat'] = frame['lat'].astype(float)
+    frame['lon'] = frame['lon'].astype(float)
+    frame['geo_precision'] = frame['geo_precision'].astype(object)
+
+    # La fila canónica lleva los links de todo el cluster, el resto solo el suyo
+    deduplicated = deduplicate_dataframe(frame)
+    sources = [[link] if link else [] for link in frame['links']]
+    duplicates = np.ones(len(frame), dtype=np.int64)
+    for position, cluster_sources, count in zip(
+            deduplicated.index, deduplicated['sources'], deduplicated['duplicates']):
+        sources[position] = cluster_sources
+        duplicates[position] = count
+    canonical = np.zeros(len(frame), dtype=bool)
+    canonical[deduplicated.index.to_numpy()] = True
+
+    frame['canonical'] = canonical
+    frame['sources'] = sources
+    frame['duplicates'] = duplicates
+    return frame
+
+
+def load_listings(filename: str) -> Optional[pd.DataFrame]:
+    """Carga datos desde el snapshot Arrow (o el CSV si no existe)"""
+    table = load_snapshot(filename)
+    if table is not None:
+        return table.to_pandas()
+    if os.path.exists(filename):
+        return pd.read_csv(filename)
+    return None
+
+
+def _numpy(column: pa.ChunkedArray) -> np.ndarray:
+    """
+    Columna numérica como array numpy de solo lectura; sin nulos y en un
+    solo chunk es una vista del archivo mapeado, sin copia
+    """
+    array = column.combine_chunks().to_numpy(zero_copy_only=False)
+    array.flags.writeable = False
+    return array
+
+
+class SharedDataset:
+    """
+    Dataset de solo lectura compartido por todas las sesiones del proceso.
+
+    Envuelve la tabla Arrow del snapshot (ya limpia, geocodificada y con los
+    duplicados agrupados), que es inmutable y está mapeada en memoria. Los
+    filtros trabajan sobre sus columnas y retornan posiciones, y solo se
+    convierten a pandas las filas que se van a mostrar.
+    """
+
+    def __init__(self, table: pa.Table):
+        self.table = table
+        self.price = _numpy(table.column('price'))
+        self.meters = _numpy(table.column('meters'))
+        self.canonical = _numpy(table.column('canonical'))
+        currency = table.column('currency').combine_chunks()
+        if not pa.types.is_dictionary(currency.type):
+            currency = currency.dictionary_encode()
+        self.currency_codes = currency.indices.to_numpy(zero_copy_only=False)
+        self.currency_codes.flags.writeable = False
+        self.currencies = np.array(currency.dictionary.to_pylist(), dtype=object)
+        self.spatial_index = SpatialGridIndex(
+            table.column('lat').to_pylist(), table.column('lon').to_pylist()
+        )
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, geocoder: Optional[Geocoder] = None) -> 'SharedDataset':
+        """Arma el dataset sin snapshot (prepara los datos en el momento)"""
+        return cls(listings_table(prepare_listings(df, geocoder)))
+
+    @classmethod
+    def from_file(cls, filename: str, geocoder: Optional[Geocoder] = None) -> Optional['SharedDataset']:
+        """
+        Abre el snapshot de un CSV; si no existe o está desactualizado lo
+        genera una vez
+        """
+        table = load_snapshot(filename)
+        if table is None:
+            if not os.path.exists(filename):
+                return None
+            build_snapshot(filename, geocoder=geocoder)
+            table = load_snapshot(filename)
+        if table is None or table.num_rows == 0:
+            return None
+        return cls(table)
+
+    def _text_matches(self, column: str, positions: np.ndarray, text: str) -> np.ndarray:
+        values = self.table.column(column).take(pa.array(positions))
+        matches = pc.match_substring(values, text, ignore_case=True)
+        return matches.fill_null(False).to_numpy(zero_copy_only=False)
+
+    def filter(self, currency: str, price_range: Tuple[float, float], meters_range: Tuple[float, float],
+               include_no_meters: bool = True, location: str = "", title: str = "",
+               group_duplicates: bool = True, near: Optional[Tuple[float, float]] = None,
+               radius_km: float = 3.0) -> np.ndarray:
+        """
+        Aplica los filtros del sidebar y retorna las posiciones (ordenadas)
+        de las filas que los cumplen
+        """
+        codes = np.flatnonzero(self.currencies == currency)
+        if not len(codes):
+            return np.empty(0, dtype=np.int64)
+        mask = (self.currency_codes == codes[0]) & (self.price >= price_range[0]) & (self.price <= price_range[1])
+
+        in_range = (self.meters >= meters_range[0]) & (self.meters <= meters_range[1])
+        if include_no_meters:
+            mask &= in_range | (self.meters == 0)
+        else:
+            mask &= in_range & (self.meters > 0)
+
+        if group_duplicates:
+            mask &= self.canonical
+
+        positions = np.flatnonzero(mask)
+
+        # Filtros de texto solo sobre las filas que quedan
+        if location and len(positions):
+            positions = positions[self._text_matches('location', positions, location)]
+        if title and len(positions):
+            positions = positions[self._text_matches('title', positions, title)]
+
+        if near is not None and len(positions):
+            nearby = np.asarray(self.spatial_index.query_radius(near[0], near[1], radius_km), dtype=np.int64)
+            positions = np.intersect1d(positions, nearby, assume_unique=True)
+
+        return positions
+
+    def view(self, positions: np.ndarray) -> pd.DataFrame:
+        """Filas seleccionadas, convertidas a pandas para mostrarlas"""
+        return self.table.take(pa.array(positions, type=pa.int64())).to_pandas(use_threads=False)
@@ -0,0 +1,340 @@
+import math
+import re
+import unicodedata
+import zlib
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import pandas as pd
+
+from lote_inmuebles import strip_tracking_params
+
+logger = logging.getLogger(__name__)
+
+# Primo de Mersenne para el hashing universal de MinHash
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Abreviaturas frecuentes en las direcciones de los portales
+_ADDRESS_REPLACEMENTS = {
+    'av': 'avenida',
+    'avda': 'avenida',
+    'gral': 'general',
+    'pte': 'presidente',
+    'ing': 'ingeniero',
+    'dr': 'doctor',
+    'sta': 'santa',
+    'sto': 'santo',
+    'caba': 'capital federal',
+}
+
+# Palabras que no aportan a la similitud entre publicaciones
+_STOPWORDS = {
+    'al', 'de', 'del', 'la', 'el', 'en', 'y', 'con', 'venta', 'vendo',
+    'dueno', 'directo', 'excelente', 'hermoso', 'hermosa', 'oportunidad',
+}
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """
+    Normaliza texto libre: sin acentos, minúsculas, sin puntuación y con
+    las abreviaturas de direcciones expandidas
+    """
+    if not text or not isinstance(text, str):
+        return ""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r'[^a-z0-9 ]+', ' ', text.lower())
+    words = [_ADDRESS_REPLACEMENTS.get(w, w) for w in text.split()]
+    return ' '.join(words)
+
+
+def normalize_price(price) -> int:
+    """
+    Normaliza el precio a entero (0 si no está publicado)
+    """
+    try:
+        value = int(float(price))
+    except (TypeError, ValueError):
+        return 0
+    return max(value, 0)
+
+
+def normalize_meters(meters) -> float:
+    """
+    Normaliza los metros cuadrados (0 si no están publicados)
+    """
+    try:
+        value = float(meters)
+    except (TypeError, ValueError):
+        return 0.0
+    if math.isnan(value) or value < 0:
+        return 0.0
+    return round(value, 1)
+
+
+def locality_token(location: Optional[str]) -> str:
+    """
+    Obtiene el barrio (CABA) o partido (GBA) de un texto de ubicación como
+    "Machaín 4146, Saavedra, Capital Federal"
+    """
+    parts = [normalize_text(p) for p in (location or "").split(',')]
+    parts = [p for p in parts if p]
+    if not parts:
+        return ""
+    if len(parts) >= 2:
+        return parts[-2]
+    return parts[0]
+
+
+def street_text(location: Optional[str]) -> str:
+    """
+    Obtiene la parte de la dirección anterior al barrio/partido, que es la que
+    distingue a una propiedad de sus vecinas
+    """
+    parts = [normalize_text(p) for p in (location or "").split(',')]
+    parts = [p for p in parts if p]
+    if len(parts) >= 3:
+        parts = parts[:-2]
+    elif len(parts) == 2:
+        parts = parts[:1]
+    return ' '.join(parts)
+
+
+def listing_key(row: Dict) -> str:
+    """
+    Identificador estable de una publicación: el id MLA o, si no hay, el
+    link sin parámetros de tracking
+    """
+    link = row.get('links') or ""
+    match = re.search(r'MLA-?(\d+)', link)
+    if match:
+        return f"MLA{match.group(1)}"
+    return strip_tracking_params(link) or f"{row.get('title')}|{row.get('location')}|{row.get('price')}"
+
+
+def price_bucket(price: int, tolerance: float = 0.05) -> int:
+    """
+    Bucket logarítmico de precio: dos precios a menos de `tolerance` de
+    diferencia (relativa al mayor) caen en el mismo bucket o en buckets
+    contiguos
+    """
+    if price <= 0:
+        return -1
+    # |a - b| <= tolerance * max(a, b) equivale a max/min <= 1 / (1 - tolerance)
+    return int(math.log(price) / -math.log1p(-tolerance))
+
+
+def shingles(text: str, k: int = 4) -> Set[int]:
+    """
+    Genera los k-shingles de caracteres (hasheados a 32 bits) de un texto
+    ya normalizado
+    """
+    words = [w for w in text.split() if w not in _STOPWORDS]
+    compact = ' '.join(words)
+    if len(compact) <= k:
+        return {zlib.crc32(compact.encode('utf-8'))} if compact else set()
+    return {
+        zlib.crc32(compact[i:i + k].encode('utf-8'))
+        for i in range(len(compact) - k + 1)
+    }
+
+
+class MinHasher:
+    """
+    Firmas MinHash con una familia de hashes universales deterministas
+    """
+
+    def __init__(self, num_perm: int = 64, seed: int = 42):
+        self.num_perm = num_perm
+        # Generador lineal congruente para no depender de `random`
+        state = seed
+        self._params = []
+        for _ in range(num_perm):
+            state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+            a = (state >> 3) % _MERSENNE_PRIME or 1
+            state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+            b = (state >> 3) % _MERSENNE_PRIME
+            self._params.append((a, b))
+
+    def signature(self, features: Iterable[int]) -> Tuple[int, ...]:
+        features = list(features)
+        if not features:
+            return tuple([_MAX_HASH] * self.num_perm)
+        return tuple(
+            min(((a * f + b) % _MERSENNE_PRIME) & _MAX_HASH for f in features)
+            for a, b in self._params
+        )
+
+    @staticmethod
+    def similarity(sig_a: Sequence[int], sig_b: Sequence[int]) -> float:
+        """Estimación de la similitud de Jaccard entre dos firmas"""
+        matches = sum(1 for x, y in zip(sig_a, sig_b) if x == y)
+        return matches / len(sig_a)
+
+
+class _UnionFind:
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+
+    def find(self, x: int) -> int:
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, x: int, y: int):
+        root_x, root_y = self.find(x), self.find(y)
+        if root_x != root_y:
+            # El índice menor queda como raíz para que el resultado sea estable
+            if root_x < root_y:
+                self.parent[root_y] = root_x
+            else:
+                self.parent[root_x] = root_y
+
+
+class ListingDeduplicator:
+    """
+    Detecta la misma propiedad publicada varias veces (distintas
+    inmobiliarias en MercadoLibre, RE/MAX, etc.).
+
+    Las publicaciones se agrupan en bloques por barrio, moneda y bucket de
+    precio, y dentro de cada bloque se usa MinHash/LSH sobre título y
+    dirección para encontrar candidatos sin comparar todos los pares.
+    """
+
+    def __init__(self, threshold: float = 0.6, num_perm: int = 64, bands: int = 16,
+                 price_tolerance: float = 0.05, meters_tolerance: float = 0.1):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm debe ser múltiplo de bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.price_tolerance = price_tolerance
+        self.meters_tolerance = meters_tolerance
+        self.hasher = MinHasher(num_perm=num_perm)
+
+    def _block_keys(self, location: str, currency: str, price: int) -> List[Tuple[str, str, int]]:
+        locality = locality_token(location)
+        bucket = price_bucket(price, self.price_tolerance)
+        if bucket < 0:
+            return [(locality, currency, -1)]
+        # Se inserta en dos buckets para no perder pares en el borde
+        return [(locality, currency, bucket), (locality, currency, bucket + 1)]
+
+    def _compatible(self, a: Dict, b: Dict) -> bool:
+        price_a, price_b = a['_price'], b['_price']
+        if price_a and price_b:
+            if abs(price_a - price_b) > self.price_tolerance * max(price_a, price_b):
+                return False
+        meters_a, meters_b = a['_meters'], b['_meters']
+        if meters_a and meters_b:
+            if abs(meters_a - meters_b) > self.meters_tolerance * max(meters_a, meters_b):
+                return False
+        return True
+
+    def cluster(self, listings: List[Dict]) -> List[List[int]]:
+        """
+        Agrupa las publicaciones duplicadas.
+
+        Retorna una lista de clusters con los índices de `listings`; las
+        publicaciones sin duplicados forman clusters de un elemento.
+        """
+        prepared = []
+        blocks = defaultdict(list)
+        for i, listing in enumerate(listings):
+            address = street_text(listing.get('location'))
+            title = normalize_text(listing.get('title'))
+            features = shingles(title) | shingles(address)
+            prepared.append({
+                '_currency': listing.get('currency') or "",
+                '_price': normalize_price(listing.get('price')),
+                '_meters': normalize_meters(listing.get('meters')),
+                '_signature': self.hasher.signature(features),
+            })
+            for key in self._block_keys(listing.get('location'), prepared[i]['_currency'],
+                                        prepared[i]['_price']):
+                blocks[key].append(i)
+
+        union_find = _UnionFind(len(listings))
+        compared = set()
+        for members in blocks.values():
+            if len(members) < 2:
+                continue
+            # LSH por bandas dentro del bloque
+            buckets = defaultdict(list)
+            for i in members:
+                signature = prepared[i]['_signature']
+                for band in range(self.bands):
+                    start = band * self.rows
+                    buckets[(band, signature[start:start + self.rows])].append(i)
+
+            for candidates in buckets.values():
+                for pos, i in enumerate(candidates):
+                    for j in candidates[pos + 1:]:
+                        pair = (i, j) if i < j else (j, i)
+                        if pair in compared:
+                            continue
+                        compared.add(pair)
+                        a, b = prepared[i], prepared[j]
+                        if not self._compatible(a, b):
+                            continue
+                        if MinHasher.similarity(a['_signature'], b['_signature']) >= self.threshold:
+                            union_find.union(i, j)
+
+        clusters = defaultdict(list)
+        for i in range(len(listings)):
+            clusters[union_find.find(i)].append(i)
+        logger.info(f"Deduplicación: {len(listings)} publicaciones en {len(clusters)} propiedades "
+                    f"({len(compared)} comparaciones)")
+        return list(clusters.values())
+
+
+def _completeness(row: Dict) -> Tuple:
+    """Orden de preferencia para elegir la publicación canónica"""
+    return (
+        normalize_meters(row.get('meters')) > 0,
+        normalize_price(row.get('price')) > 0,
+        bool(row.get('image')),
+        -int(row.get('ID') or 0),
+    )
+
+
+def deduplicate_dataframe(df: pd.DataFrame, deduplicator: Optional[ListingDeduplicator] = None) -> pd.DataFrame:
+    """
+    Colapsa las publicaciones duplicadas en una única fila canónica.
+
+    Agrega las columnas `sources` (enlaces de todas las publicaciones del
+    cluster) y `duplicates` (cantidad de publicaciones agrupadas).
+    """
+    if df.empty:
+        result = df.copy()
+        result['sources'] = pd.Series(dtype=object)
+        result['duplicates'] = pd.Series(dtype=int)
+        return result
+
+    deduplicator = deduplicator or ListingDeduplicator()
+    records = df.to_dict('records')
+    clusters = deduplicator.cluster(records)
+
+    canonical_positions = []
+    sources = []
+    counts = []
+    for members in clusters:
+        best = max(members, key=lambda i: _completeness(records[i]))
+        canonical_positions.append(best)
+        # La misma publicación puede aparecer con distinto tracking_id/position
+        links = {}
+        for i in sorted(members, key=lambda i: i != best):
+            link = records[i].get('links')
+            if link:
+                links.setdefault(listing_key(records[i]), link)
+        links = list(links.values())
+        sources.append(links)
+        counts.append(len(members))
+
+    result = df.iloc[canonical_positions].copy()
+    result['sources'] = sources
+    result['duplicates'] = counts
+    return result.sort_index()
@@ -0,0 +1,185 @@
+import json
+import os
+import re
+import threading
+import unicodedata
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import pandas as pd
+
+from deduplicacion import listing_key
+from scraper_inmuebles import MercadoLibreInmueblesScraper
+
+logger = logging.getLogger(__name__)
+
+DETAILS_CACHE_FILE = "detalles_cache.json"
+
+# Atributos de la ficha de detalle: (campo, patrón sobre el texto normalizado).
+# Las filas de la ficha técnica llegan como "etiqueta = valor" y los
+# destacados como "95 m2 cubiertos", "3 dormitorios", etc.
+DETAIL_PATTERNS = [
+    ('covered_meters', re.compile(r'superficie cubierta = (\d+(?:[.,]\d+)*)')),
+    ('total_meters', re.compile(r'superficie total = (\d+(?:[.,]\d+)*)')),
+    ('ambientes', re.compile(r'ambientes = (\d+)')),
+    ('dormitorios', re.compile(r'dormitorios = (\d+)')),
+    ('covered_meters', re.compile(r'(\d+(?:[.,]\d+)*)\s*m2?\s*cubiertos?')),
+    ('total_meters', re.compile(r'(\d+(?:[.,]\d+)*)\s*m2?\s*totales')),
+    ('ambientes', re.compile(r'(\d+)\s*amb(?:ientes?)?\b')),
+    ('dormitorios', re.compile(r'(\d+)\s*dormitorios?')),
+]
+
+DETAIL_FIELDS = ['covered_meters', 'total_meters', 'ambientes', 'dormitorios']
+
+
+def _to_number(text: str) -> float:
+    """
+    Convierte "1.200" (separador de miles), "95,5" (decimal) o
+    "1.250,50" (ambos) a float
+    """
+    if ',' in text and '.' in text:
+        # El último separador es el decimal
+        if text.rfind(',') > text.rfind('.'):
+            return float(text.replace('.', '').replace(',', '.'))
+        return float(text.replace(',', ''))
+    if re.fullmatch(r'\d{1,3}(?:\.\d{3})+', text):
+        return float(text.replace('.', ''))
+    if text.count(',') > 1 or text.count('.') > 1:
+        raise ValueError(f"número ambiguo: {text}")
+    return float(text.replace(',', '.'))
+
+
+def parse_detail_text(text: str) -> Dict[str, Optional[float]]:
+    """
+    Extrae m² cubiertos/totales, ambientes y dormitorios del texto de la
+    ficha técnica y los destacados de una página de detalle
+    """
+    # NFKD también convierte "m²" en "m2"
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    text = re.sub(r'\s*=\s*', ' = ', text)
+    text = re.sub(r'[^a-z0-9.,=]+', ' ', text)
+    details = dict.fromkeys(DETAIL_FIELDS)
+    for field, pattern in DETAIL_PATTERNS:
+        if details[field] is not None:
+            continue
+        match = pattern.search(text)
+        if match:
+            try:
+                details[field] = _to_number(match.group(1))
+            except ValueError:
+                continue
+    return details
+
+
+class DetailEnricher:
+    """
+    Completa los datos que faltan en las tarjetas del listado (metraje,
+    ambientes, dormitorios) consultando las páginas de detalle.
+
+    Las consultas se hacen en paralelo con el rate limit y la sesión del
+    scraper, y los resultados se guardan por id de publicación para no
+    volver a pedirlos.
+    """
+
+    def __init__(self, scraper: Optional[MercadoLibreInmueblesScraper] = None,
+                 cache_file: Optional[str] = DETAILS_CACHE_FILE, max_workers: int = 8):
+        self.scraper = scraper or MercadoLibreInmueblesScraper()
+        self.cache_file = cache_file
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self.cache = self._load_cache()
+
+    def _load_cache(self) -> Dict[str, Dict]:
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Error cargando cache de detalles: {e}")
+            return {}
+
+    def save_cache(self):
+        if not self.cache_file:
+            return
+        tmp_file = f"{self.cache_file}.tmp"
+        try:
+            with self._lock:
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump(self.cache, f, ensure_ascii=False)
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            logger.warning(f"Error guardando cache de detalles: {e}")
+
+    def fetch_details(self, url: str) -> Optional[Dict]:
+        """
+        Descarga y parsea la página de detalle de una publicación; ante
+        cualquier error retorna None, para no cortar el resto del lote
+        """
+        try:
+            return self._fetch_details(url)
+        except Exception as e:
+            logger.warning(f"Error procesando página de detalle {url}: {e}")
+            return None
+
+    def _fetch_details(self, url: str) -> Optional[Dict]:
+        soup = self.scraper.get_soup(url)
+        if not soup:
+            return None
+        parts = []
+        # Ficha técnica
+        for row in soup.select('.andes-table tr'):
+            label, value = row.find('th'), row.find('td')
+            if label and value:
+                parts.append(f"{label.get_text(strip=True)} = {value.get_text(strip=True)}")
+        # Destacados
+        for elem in soup.select('.ui-pdp-highlighted-specs-res, .ui-vpp-highlighted-specs'):
+            parts.append(elem.get_text(' ', strip=True))
+        if not parts:
+            # El resto de la página incluye publicaciones similares: no se
+            # adivina a partir de ahí ni se guarda en cache
+            logger.warning(f"Sin ficha técnica ni destacados en {url}")
+            return None
+        return parse_detail_text(' '.join(parts))
+
+    def enrich(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Retorna el DataFrame con `meters` completado (m² cubiertos o, si no
+        hay, totales) y las columnas total_meters, ambientes y dormitorios
+        """
+        df = df.copy()
+        keys = [listing_key(row) for row in df[['links', 'title', 'location', 'price']].to_dict('records')]
+
+        # Solo se piden las publicaciones sin metraje que no estén en cache
+        pending = {}
+        for key, link, meters in zip(keys, df['links'], df['meters']):
+            if key in self.cache or key in pending or not link:
+                continue
+            if not meters or meters <= 0:
+                pending[key] = link
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                results = executor.map(self.fetch_details, pending.values())
+                for key, details in zip(pending.keys(), results):
+                    if details is not None:
+                        with self._lock:
+                            self.cache[key] = details
+            self.save_cache()
+            logger.info(f"Enriquecimiento: {len(pending)} páginas de detalle consultadas")
+
+        details = [self.cache.get(key, {}) for key in keys]
+
+        def column(field: str) -> pd.Series:
+            return pd.Series([d.get(field) for d in details], index=df.index, dtype=float)
+
+        covered, total = column('covered_meters'), column('total_meters')
+        df['meters'] = df['meters'].astype(float)
+        missing = df['meters'].fillna(0) <= 0
+        df.loc[missing, 'meters'] = covered.fillna(total)[missing].fillna(0)
+        for field, values in (('total_meters', total), ('ambientes', column('ambientes')),
+                              ('dormitorios', column('dormitorios'))):
+            df[field] = values.fillna(df[field]) if field in df.columns else values
+        return df
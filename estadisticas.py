@@ -0,0 +1,331 @@
+import bisect
+import json
+import math
+import os
+import re
+import threading
+import logging
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+from deduplicacion import listing_key, locality_token, normalize_text
+
+logger = logging.getLogger(__name__)
+
+MARKET_STATS_FILE = "market_stats.json"
+# Versión 2: los grupos se separan también por moneda. Versión 3: el
+# resumen diario se calcula solo con las publicaciones vistas ese día
+MARKET_STATS_VERSION = 3
+
+# Tipos de propiedad detectados en el título, en orden de prioridad
+PROPERTY_TYPES = [
+    ('ph', re.compile(r'\bph\b')),
+    ('departamento', re.compile(r'\b(departamento|depto|dpto|monoambiente|duplex|triplex|loft)\b')),
+    ('casa', re.compile(r'\b(casa|chalet|quinta)\b')),
+    ('terreno', re.compile(r'\b(terreno|lote)\b')),
+    ('local', re.compile(r'\b(local|oficina|galpon|deposito)\b')),
+]
+OTHER_TYPE = 'otro'
+
+
+def property_type(title: Optional[str]) -> str:
+    """Clasifica la publicación según su título"""
+    text = normalize_text(title)
+    for name, pattern in PROPERTY_TYPES:
+        if pattern.search(text):
+            return name
+    return OTHER_TYPE
+
+
+class RunningStats:
+    """Cantidad, media y varianza incrementales (algoritmo de Welford)"""
+
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def to_dict(self) -> Dict:
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'RunningStats':
+        return cls(data['count'], data['mean'], data['m2'])
+
+
+class QuantileSketch:
+    """
+    Sketch de cuantiles con error relativo acotado (estilo DDSketch): los
+    valores se cuentan en buckets logarítmicos, así que la memoria depende
+    del rango de valores y no de la cantidad de publicaciones
+    """
+
+    __slots__ = ('relative_accuracy', 'gamma', '_log_gamma', 'buckets', 'count')
+
+    def __init__(self, relative_accuracy: float = 0.01, buckets: Optional[Dict[int, int]] = None):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = defaultdict(int, buckets or {})
+        self.count = sum(self.buckets.values())
+
+    def _index(self, value: float) -> int:
+        return int(math.ceil(math.log(value) / self._log_gamma))
+
+    def _value(self, index: int) -> float:
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, value: float):
+        if value <= 0:
+            return
+        self.buckets[self._index(value)] += 1
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        cumulative = 0
+        for index in sorted(self.buckets):
+            cumulative += self.buckets[index]
+            if cumulative > rank:
+                return self._value(index)
+        return self._value(max(self.buckets))
+
+    def to_dict(self) -> Dict:
+        return {'relative_accuracy': self.relative_accuracy,
+                'buckets': {str(k): v for k, v in self.buckets.items()}}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'QuantileSketch':
+        return cls(data['relative_accuracy'], {int(k): v for k, v in data['buckets'].items()})
+
+
+class _GroupStats:
+    __slots__ = ('stats', 'sketch', '_cumulative')
+
+    def __init__(self, stats: Optional[RunningStats] = None, sketch: Optional[QuantileSketch] = None):
+        self.stats = stats or RunningStats()
+        self.sketch = sketch or QuantileSketch()
+        self._cumulative = None
+
+    def add(self, value: float):
+        self.stats.add(value)
+        self.sketch.add(value)
+        self._cumulative = None
+
+    def percentile_rank(self, value: float) -> Optional[float]:
+        """Porcentaje de publicaciones con precio/m² menor o igual a `value`"""
+        if not self.sketch.count or value <= 0:
+            return None
+        if self._cumulative is None:
+            # Conteo acumulado por bucket, recalculado solo si hubo datos nuevos
+            indices = sorted(self.sketch.buckets)
+            cumulative = []
+            running = 0
+            for index in indices:
+                running += self.sketch.buckets[index]
+                cumulative.append(running)
+            self._cumulative = (indices, cumulative)
+        indices, cumulative = self._cumulative
+        pos = bisect.bisect_right(indices, self.sketch._index(value)) - 1
+        if pos < 0:
+            return 0.0
+        return 100.0 * cumulative[pos] / self.sketch.count
+
+    def summary(self) -> Dict:
+        return {
+            'count': self.stats.count,
+            'mean': self.stats.mean,
+            'std': math.sqrt(self.stats.variance),
+            'median': self.sketch.quantile(0.5),
+            'p90': self.sketch.quantile(0.9),
+        }
+
+
+class MarketStats:
+    """
+    Estadísticas de precio/m² por barrio, tipo de propiedad y moneda que se
+    actualizan con cada lote scrapeado, sin volver a recorrer el historial.
+
+    Las estadísticas históricas cuentan cada publicación una sola vez, la
+    primera vez que aparece con precio y metraje. Además se llevan
+    estadísticas del día en curso con las publicaciones vistas ese día
+    (nuevas o no), y su resumen (cantidad, media, desvío, mediana y p90)
+    queda guardado por fecha para mostrar tendencias.
+    """
+
+    def __init__(self, stats_file: Optional[str] = MARKET_STATS_FILE):
+        self.stats_file = stats_file
+        self.groups: Dict[Tuple[str, str, str], _GroupStats] = {}
+        self.snapshots: Dict[str, Dict[str, Dict]] = {}
+        self.seen = set()
+        self.day: Optional[str] = None
+        self.day_groups: Dict[Tuple[str, str, str], _GroupStats] = {}
+        self.day_seen = set()
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def _group_id(key: Tuple[str, str, str]) -> str:
+        return '|'.join(key)
+
+    @classmethod
+    def _dump_groups(cls, groups: Dict[Tuple[str, str, str], _GroupStats]) -> Dict:
+        return {
+            cls._group_id(key): {'stats': group.stats.to_dict(), 'sketch': group.sketch.to_dict()}
+            for key, group in groups.items()
+        }
+
+    @staticmethod
+    def _load_groups(data: Dict) -> Dict[Tuple[str, str, str], _GroupStats]:
+        groups = {}
+        for group_id, group in data.items():
+            neighbourhood, ptype, currency = group_id.split('|', 2)
+            groups[(neighbourhood, ptype, currency)] = _GroupStats(
+                RunningStats.from_dict(group['stats']),
+                QuantileSketch.from_dict(group['sketch']),
+            )
+        return groups
+
+    def _load(self):
+        if not self.stats_file or not os.path.exists(self.stats_file):
+            return
+        try:
+            with open(self.stats_file, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != MARKET_STATS_VERSION:
+                # Las versiones viejas mezclaban monedas o guardaban el
+                # histórico como resumen diario: se vuelve a empezar
+                logger.info("Estadísticas de mercado de otra versión, se descartan")
+                return
+            self.groups = self._load_groups(data['groups'])
+            self.snapshots = data['snapshots']
+            self.seen = set(data['seen'])
+            self.day = data['day']['date']
+            self.day_groups = self._load_groups(data['day']['groups'])
+            self.day_seen = set(data['day']['seen'])
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Error cargando estadísticas de mercado: {e}")
+
+    def save(self):
+        if not self.stats_file:
+            return
+        data = {
+            'version': MARKET_STATS_VERSION,
+            'groups': self._dump_groups(self.groups),
+            'snapshots': self.snapshots,
+            'seen': sorted(self.seen),
+            'day': {
+                'date': self.day,
+                'groups': self._dump_groups(self.day_groups),
+                'seen': sorted(self.day_seen),
+            },
+        }
+        tmp_file = f"{self.stats_file}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_file, self.stats_file)
+        except OSError as e:
+            logger.warning(f"Error guardando estadísticas de mercado: {e}")
+
+    def update(self, df: pd.DataFrame, day: Optional[date] = None) -> int:
+        """
+        Incorpora un lote de publicaciones y actualiza el resumen del día.
+        Retorna la cantidad de publicaciones nuevas.
+        """
+        day = (day or date.today()).isoformat()
+        with self._lock:
+            added = self._update(df.to_dict('records'), day)
+        logger.info(f"Estadísticas de mercado: {added} publicaciones nuevas")
+        return added
+
+    def _update(self, records, day: str) -> int:
+        if day != self.day:
+            # Empieza otro día: el resumen del anterior ya quedó en snapshots
+            self.day = day
+            self.day_groups = {}
+            self.day_seen = set()
+
+        touched = set()
+        added = 0
+        for row in records:
+            key = listing_key(row)
+            if key in self.seen and key in self.day_seen:
+                continue
+            try:
+                price, meters = float(row.get('price') or 0), float(row.get('meters') or 0)
+            except (TypeError, ValueError):
+                continue
+            if price <= 0 or meters <= 0 or math.isnan(price) or math.isnan(meters):
+                continue
+            group_key = (locality_token(row.get('location')), property_type(row.get('title')),
+                         row.get('currency') or "")
+            value = price / meters
+            if key not in self.day_seen:
+                self.day_seen.add(key)
+                group = self.day_groups.get(group_key)
+                if group is None:
+                    group = self.day_groups[group_key] = _GroupStats()
+                group.add(value)
+                touched.add(group_key)
+            if key not in self.seen:
+                self.seen.add(key)
+                group = self.groups.get(group_key)
+                if group is None:
+                    group = self.groups[group_key] = _GroupStats()
+                group.add(value)
+                added += 1
+
+        if touched:
+            snapshot = self.snapshots.setdefault(day, {})
+            for key in touched:
+                snapshot[self._group_id(key)] = self.day_groups[key].summary()
+            self.save()
+        return added
+
+    def summary(self, neighbourhood: str, ptype: str, currency: str) -> Optional[Dict]:
+        # El objeto se comparte entre sesiones: las lecturas también toman
+        # el lock para no recorrer los buckets mientras otra los modifica
+        with self._lock:
+            group = self.groups.get((neighbourhood, ptype, currency))
+            return group.summary() if group else None
+
+    def percentile_rank(self, location: str, title: str, currency: str,
+                        price: float, meters: float) -> Optional[float]:
+        """Percentil del precio/m² de una publicación dentro de su barrio, tipo y moneda"""
+        if not price or not meters or price <= 0 or meters <= 0:
+            return None
+        group_key = (locality_token(location), property_type(title), currency or "")
+        with self._lock:
+            group = self.groups.get(group_key)
+            if group is None:
+                return None
+            return group.percentile_rank(price / meters)
+
+    def trend(self, neighbourhood: str, ptype: str, currency: str) -> pd.DataFrame:
+        """Evolución diaria de los indicadores de un barrio, tipo y moneda"""
+        group_id = self._group_id((neighbourhood, ptype, currency))
+        rows = []
+        with self._lock:
+            for day in sorted(self.snapshots):
+                summary = self.snapshots[day].get(group_id)
+                if summary:
+                    rows.append({'date': day, **summary})
+        return pd.DataFrame(rows, columns=['date', 'count', 'mean', 'std', 'median', 'p90'])
@@ -0,0 +1,427 @@
+import csv
+import json
+import math
+import os
+import re
+import threading
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from deduplicacion import normalize_text
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+
+# Centroides aproximados (lat, lon) de barrios de CABA, incluyendo los
+# sub-barrios que usan los portales
+BARRIOS_CABA = {
+    'agronomia': (-34.592, -58.491),
+    'almagro': (-34.609, -58.421),
+    'balvanera': (-34.609, -58.403),
+    'barracas': (-34.646, -58.382),
+    'belgrano': (-34.562, -58.456),
+    'belgrano c': (-34.561, -58.456),
+    'belgrano r': (-34.566, -58.466),
+    'boedo': (-34.630, -58.417),
+    'caballito': (-34.618, -58.443),
+    'chacarita': (-34.587, -58.455),
+    'coghlan': (-34.560, -58.474),
+    'colegiales': (-34.574, -58.450),
+    'constitucion': (-34.627, -58.384),
+    'flores': (-34.628, -58.463),
+    'floresta': (-34.628, -58.483),
+    'la boca': (-34.634, -58.363),
+    'boca': (-34.634, -58.363),
+    'la paternal': (-34.598, -58.468),
+    'paternal': (-34.598, -58.468),
+    'liniers': (-34.643, -58.520),
+    'mataderos': (-34.659, -58.503),
+    'monte castro': (-34.619, -58.506),
+    'monserrat': (-34.613, -58.381),
+    'montserrat': (-34.613, -58.381),
+    'nueva pompeya': (-34.650, -58.417),
+    'pompeya': (-34.650, -58.417),
+    'nunez': (-34.545, -58.463),
+    'palermo': (-34.580, -58.425),
+    'palermo chico': (-34.577, -58.405),
+    'palermo hollywood': (-34.583, -58.436),
+    'palermo soho': (-34.588, -58.430),
+    'palermo viejo': (-34.588, -58.430),
+    'las canitas': (-34.568, -58.436),
+    'botanico': (-34.582, -58.418),
+    'parque avellaneda': (-34.647, -58.479),
+    'parque chacabuco': (-34.636, -58.438),
+    'parque chas': (-34.585, -58.479),
+    'parque patricios': (-34.637, -58.401),
+    'parque centenario': (-34.606, -58.435),
+    'puerto madero': (-34.611, -58.363),
+    'recoleta': (-34.588, -58.397),
+    'barrio norte': (-34.594, -58.401),
+    'retiro': (-34.592, -58.375),
+    'saavedra': (-34.555, -58.486),
+    'san cristobal': (-34.624, -58.401),
+    'san nicolas': (-34.603, -58.381),
+    'centro microcentro': (-34.604, -58.376),
+    'microcentro': (-34.604, -58.376),
+    'congreso': (-34.609, -58.392),
+    'once': (-34.608, -58.406),
+    'abasto': (-34.604, -58.411),
+    'tribunales': (-34.602, -58.385),
+    'san telmo': (-34.621, -58.372),
+    'velez sarsfield': (-34.632, -58.492),
+    'versalles': (-34.631, -58.521),
+    'villa crespo': (-34.599, -58.438),
+    'villa del parque': (-34.604, -58.490),
+    'villa devoto': (-34.601, -58.513),
+    'villa general mitre': (-34.611, -58.468),
+    'villa lugano': (-34.676, -58.473),
+    'villa luro': (-34.638, -58.502),
+    'villa ortuzar': (-34.580, -58.468),
+    'villa pueyrredon': (-34.581, -58.502),
+    'villa real': (-34.620, -58.525),
+    'villa riachuelo': (-34.689, -58.469),
+    'villa santa rita': (-34.615, -58.481),
+    'villa soldati': (-34.665, -58.445),
+    'villa urquiza': (-34.572, -58.488),
+    'capital federal': (-34.603, -58.438),
+}
+
+# Centroides aproximados de partidos y localidades del GBA y la costa
+PARTIDOS_GBA = {
+    'vicente lopez': (-34.526, -58.475),
+    'olivos': (-34.510, -58.488),
+    'florida': (-34.531, -58.493),
+    'munro': (-34.528, -58.521),
+    'san isidro': (-34.471, -58.528),
+    'martinez': (-34.491, -58.507),
+    'acassuso': (-34.476, -58.506),
+    'beccar': (-34.464, -58.537),
+    'villa adelina': (-34.515, -58.546),
+    'boulogne': (-34.497, -58.563),
+    'san fernando': (-34.442, -58.559),
+    'victoria': (-34.455, -58.546),
+    'tigre': (-34.426, -58.580),
+    'nordelta': (-34.405, -58.644),
+    'benavidez': (-34.412, -58.690),
+    'escobar': (-34.349, -58.797),
+    'puertos': (-34.335, -58.732),
+    'pilar': (-34.459, -58.914),
+    'pilar del este': (-34.455, -58.842),
+    'del viso': (-34.449, -58.797),
+    'san miguel': (-34.543, -58.712),
+    'bella vista': (-34.561, -58.693),
+    'jose c paz': (-34.516, -58.768),
+    'malvinas argentinas': (-34.489, -58.700),
+    'general san martin': (-34.575, -58.538),
+    'san martin': (-34.575, -58.538),
+    'villa ballester': (-34.547, -58.557),
+    'tres de febrero': (-34.602, -58.565),
+    'caseros': (-34.606, -58.563),
+    'ciudad jardin lomas del palomar': (-34.604, -58.597),
+    'hurlingham': (-34.589, -58.639),
+    'moron': (-34.653, -58.620),
+    'haedo': (-34.644, -58.594),
+    'castelar': (-34.652, -58.645),
+    'ituzaingo': (-34.658, -58.667),
+    'moreno': (-34.650, -58.790),
+    'merlo': (-34.665, -58.727),
+    'la matanza': (-34.770, -58.625),
+    'ramos mejia': (-34.641, -58.565),
+    'san justo': (-34.681, -58.561),
+    'avellaneda': (-34.662, -58.365),
+    'wilde': (-34.702, -58.320),
+    'lanus': (-34.706, -58.392),
+    'quilmes': (-34.720, -58.254),
+    'bernal': (-34.708, -58.279),
+    'berazategui': (-34.764, -58.213),
+    'guillermo enrique hudson': (-34.791, -58.157),
+    'hudson': (-34.791, -58.157),
+    'florencio varela': (-34.807, -58.276),
+    'lomas de zamora': (-34.762, -58.406),
+    'banfield': (-34.744, -58.394),
+    'temperley': (-34.775, -58.396),
+    'adrogue': (-34.800, -58.384),
+    'almirante brown': (-34.826, -58.369),
+    'esteban echeverria': (-34.816, -58.466),
+    'canning': (-34.862, -58.503),
+    'ezeiza': (-34.854, -58.523),
+    'la plata': (-34.921, -57.954),
+    'pinamar': (-37.109, -56.861),
+    'mar del plata': (-38.005, -57.543),
+}
+
+# Provincias y ciudades fuera del AMBA: si una ubicación las menciona, un
+# barrio o calle homónimo de Buenos Aires no es una coincidencia válida
+FUERA_DE_AMBA = {
+    'catamarca', 'chaco', 'chubut', 'cordoba', 'corrientes', 'entre rios',
+    'formosa', 'jujuy', 'la pampa', 'la rioja', 'mendoza', 'misiones',
+    'neuquen', 'rio negro', 'salta', 'san juan', 'san luis', 'santa cruz',
+    'santa fe', 'santiago del estero', 'tierra del fuego', 'tucuman',
+    'rosario', 'parana', 'santa rosa', 'posadas', 'resistencia', 'bariloche',
+    'san carlos de bariloche', 'san miguel de tucuman', 'villa carlos paz',
+    'uruguay', 'punta del este', 'montevideo',
+}
+
+# Niveles de precisión del geocodificador, de más a menos preciso
+PRECISION_STREET = 'calle'
+PRECISION_BARRIO = 'barrio'
+PRECISION_PARTIDO = 'partido'
+
+GEOCODING_CACHE_FILE = "geocoding_cache.json"
+# Se incrementa cuando cambia la resolución, para descartar la cache vieja
+GEOCODING_CACHE_VERSION = 2
+STREETS_GAZETTEER_FILE = "gazetteer_calles.csv"
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distancia en km sobre la esfera terrestre"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def parse_street(part: str) -> Tuple[str, Optional[int]]:
+    """
+    Separa calle y altura de la primera parte de una ubicación normalizada,
+    p. ej. "blanco encalada al 3400" -> ("blanco encalada", 3400)
+    """
+    match = re.match(r'^(.*?)\s+(?:al\s+)?(\d{1,5})\b', part)
+    if not match:
+        return part.strip(), None
+    return match.group(1).strip(), int(match.group(2))
+
+
+class Geocoder:
+    """
+    Geocodificador offline basado en un gazetteer local de barrios, partidos
+    y (opcionalmente) tramos de calles, con cache persistente por dirección
+    normalizada.
+
+    Sin el archivo de calles (ver README) la precisión máxima es el
+    centroide del barrio o partido.
+    """
+
+    def __init__(self, cache_file: Optional[str] = GEOCODING_CACHE_FILE,
+                 streets_file: Optional[str] = STREETS_GAZETTEER_FILE):
+        self.cache_file = cache_file
+        self.places = {}
+        for name, coords in PARTIDOS_GBA.items():
+            self.places[name] = (coords, PRECISION_PARTIDO)
+        for name, coords in BARRIOS_CABA.items():
+            self.places[name] = (coords, PRECISION_BARRIO)
+        self.streets = self._load_streets(streets_file)
+        self._lock = threading.Lock()
+        self.cache = self._load_cache()
+        self._dirty = False
+
+    def _load_streets(self, filename: Optional[str]) -> Dict[str, List[Tuple]]:
+        """
+        Carga tramos de calles desde un CSV con columnas street, locality,
+        number_from, number_to, lat_from, lon_from, lat_to, lon_to
+        """
+        streets = defaultdict(list)
+        if not filename or not os.path.exists(filename):
+            return streets
+        try:
+            with open(filename, encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    key = (normalize_text(row['street']), normalize_text(row.get('locality', '')))
+                    streets[key].append((
+                        int(row['number_from']), int(row['number_to']),
+                        float(row['lat_from']), float(row['lon_from']),
+                        float(row['lat_to']), float(row['lon_to']),
+                    ))
+            logger.info(f"Gazetteer de calles cargado: {len(streets)} calles")
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"Error cargando gazetteer de calles {filename}: {e}")
+        return streets
+
+    def _load_cache(self) -> Dict[str, Optional[List]]:
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Error cargando cache de geocodificación: {e}")
+            return {}
+        if not isinstance(data, dict) or data.get('version') != GEOCODING_CACHE_VERSION:
+            logger.info("Cache de geocodificación de otra versión, se descarta")
+            return {}
+        return data.get('entries', {})
+
+    def save_cache(self):
+        """Persiste la cache si hubo direcciones nuevas"""
+        if not self.cache_file or not self._dirty:
+            return
+        # El geocodificador se comparte entre sesiones: se guarda una copia
+        # para no iterar la cache mientras otra sesión la modifica
+        with self._lock:
+            entries = dict(self.cache)
+            self._dirty = False
+        tmp_file = f"{self.cache_file}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({'version': GEOCODING_CACHE_VERSION, 'entries': entries}, f, ensure_ascii=False)
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            self._dirty = True
+            logger.warning(f"Error guardando cache de geocodificación: {e}")
+
+    def _match_street(self, street: str, number: int, localities: List[str]) -> Optional[Tuple[float, float]]:
+        for locality in localities:
+            for start, end, lat1, lon1, lat2, lon2 in self.streets.get((street, locality), ()):
+                if start <= number <= end:
+                    # Interpolación lineal a lo largo del tramo
+                    t = (number - start) / (end - start) if end > start else 0.0
+                    return lat1 + t * (lat2 - lat1), lon1 + t * (lon2 - lon1)
+        return None
+
+    def _resolve(self, parts: List[str]) -> Optional[List]:
+        # Una ubicación fuera del AMBA ("Abasto, Rosario, Santa Fe") no se
+        # resuelve con barrios o calles homónimos de Buenos Aires
+        if any(part in FUERA_DE_AMBA for part in parts[1:]):
+            return None
+        # Con tres o más partes la primera es la calle
+        localities = parts[1:] if len(parts) >= 3 else parts
+        if self.streets and len(parts) >= 3:
+            street, number = parse_street(parts[0])
+            if number is not None:
+                coords = self._match_street(street, number, localities)
+                if coords:
+                    return [coords[0], coords[1], PRECISION_STREET]
+
+        # De la parte más específica a la menos específica: en cada parte
+        # primero el nombre exacto y si no el más largo contenido en ella
+        # ("belgrano barrancas" -> belgrano)
+        for part in localities:
+            place = self.places.get(part)
+            if place is None:
+                names = [name for name in self.places if re.search(rf'\b{re.escape(name)}\b', part)]
+                if names:
+                    place = self.places[max(names, key=len)]
+            if place:
+                (lat, lon), precision = place
+                return [lat, lon, precision]
+        return None
+
+    def geocode(self, location: Optional[str]) -> Optional[Tuple[float, float, str]]:
+        """
+        Retorna (lat, lon, precisión) para un texto de ubicación o None si no
+        se pudo resolver
+        """
+        parts = [normalize_text(p) for p in (location or "").split(',')]
+        parts = [p for p in parts if p]
+        if not parts:
+            return None
+        key = ', '.join(parts)
+        with self._lock:
+            if key not in self.cache:
+                self.cache[key] = self._resolve(parts)
+                self._dirty = True
+            result = self.cache[key]
+        return tuple(result) if result else None
+
+    def geocode_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Agrega las columnas lat, lon y geo_precision al DataFrame
+        """
+        df = df.copy()
+        results = [self.geocode(location) for location in df['location']]
+        df['lat'] = [r[0] if r else None for r in results]
+        df['lon'] = [r[1] if r else None for r in results]
+        df['geo_precision'] = [r[2] if r else None for r in results]
+        self.save_cache()
+        return df
+
+
+class SpatialGridIndex:
+    """
+    Índice espacial de grilla regular para consultas por radio.
+
+    Cada punto se guarda en la celda que le corresponde; una consulta solo
+    revisa las celdas que intersectan el rectángulo que contiene al círculo.
+    """
+
+    def __init__(self, lats: Sequence[float], lons: Sequence[float], cell_km: float = 1.0):
+        self.cell_lat = cell_km / 111.32
+        # Escala de longitud a la latitud de Buenos Aires
+        self.cell_lon = cell_km / (111.32 * math.cos(math.radians(-34.6)))
+        self.lats = list(lats)
+        self.lons = list(lons)
+        self.cells = defaultdict(list)
+        for i, (lat, lon) in enumerate(zip(self.lats, self.lons)):
+            if lat is None or lon is None or lat != lat or lon != lon:
+                continue
+            self.cells[self._cell(lat, lon)].append(i)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_lat)), int(math.floor(lon / self.cell_lon))
+
+    def query_radius(self, lat: float, lon: float, radius_km: float) -> List[int]:
+        """Posiciones de los puntos a menos de `radius_km` del centro"""
+        d_lat = radius_km / 111.32
+        d_lon = radius_km / (111.32 * max(math.cos(math.radians(lat)), 1e-6))
+        min_row, min_col = self._cell(lat - d_lat, lon - d_lon)
+        max_row, max_col = self._cell(lat + d_lat, lon + d_lon)
+
+        result = []
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                for i in self.cells.get((row, col), ()):
+                    if haversine_km(lat, lon, self.lats[i], self.lons[i]) <= radius_km:
+                        result.append(i)
+        result.sort()
+        return result
+
+
+def hex_bins(lats: Sequence[float], lons: Sequence[float], values: Sequence[float],
+             radius_km: float = 0.5) -> List[Dict]:
+    """
+    Agrega puntos en hexágonos (en el servidor) y retorna un registro por
+    hexágono con su centro, cantidad de puntos y promedio de `values`
+    """
+    if not len(lats):
+        return []
+    lat0 = sum(lats) / len(lats)
+    km_per_lon = 111.32 * math.cos(math.radians(lat0))
+    size = radius_km
+
+    bins = defaultdict(lambda: [0, 0.0])
+    for lat, lon, value in zip(lats, lons, values):
+        x = lon * km_per_lon
+        y = lat * 111.32
+        # Coordenadas axiales de hexágonos "pointy-top" con redondeo cúbico
+        q = (math.sqrt(3) / 3 * x - y / 3) / size
+        r = (2 / 3 * y) / size
+        cx, cz = q, r
+        cy = -cx - cz
+        rx, ry, rz = round(cx), round(cy), round(cz)
+        dx, dy, dz = abs(rx - cx), abs(ry - cy), abs(rz - cz)
+        if dx > dy and dx > dz:
+            rx = -ry - rz
+        elif dy > dz:
+            ry = -rx - rz
+        else:
+            rz = -rx - ry
+        bucket = bins[(rx, rz)]
+        bucket[0] += 1
+        bucket[1] += value
+
+    result = []
+    for (q, r), (count, total) in bins.items():
+        x = size * (math.sqrt(3) * q + math.sqrt(3) / 2 * r)
+        y = size * 1.5 * r
+        result.append({
+            'lat': y / 111.32,
+            'lon': x / km_per_lon,
+            'count': count,
+            'mean_value': total / count,
+        })
+    return result
@@ -0,0 +1,124 @@
+import sys
+from array import array
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Parámetros de query que MercadoLibre agrega a los links para tracking
+TRACKING_PARAMS = {
+    'highlight', 'headerTopBrand', 'tracking_id', 'position', 'search_layout',
+    'type', 'polycard_client', 'reco_backend', 'reco_client', 'reco_item_pos',
+    'reco_id', 'c_id', 'c_uid', 'da_id', 'da_position', 'id_origin', 'da_sort_algorithm',
+}
+
+COLUMNS = ['ID', 'title', 'currency', 'price', 'location', 'meters', 'image', 'links']
+
+
+def strip_tracking_params(url: Optional[str]) -> str:
+    """
+    Elimina los parámetros de tracking y el fragmento (#polycard_client=...)
+    de un link de publicación
+    """
+    if not url:
+        return ""
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in TRACKING_PARAMS]
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ''))
+
+
+class _StringPool:
+    """
+    Columna de strings de baja cardinalidad: cada valor distinto se guarda
+    (internado) una sola vez y las filas guardan su código
+    """
+
+    __slots__ = ('codes', 'values', '_lookup')
+
+    def __init__(self):
+        self.codes = array('i')
+        self.values: List[str] = []
+        self._lookup: Dict[str, int] = {}
+
+    def append(self, value: str):
+        code = self._lookup.get(value)
+        if code is None:
+            code = len(self.values)
+            value = sys.intern(value)
+            self.values.append(value)
+            self._lookup[value] = code
+        self.codes.append(code)
+
+    def to_arrow(self) -> pa.DictionaryArray:
+        indices = pa.Array.from_buffers(pa.int32(), len(self.codes), [None, pa.py_buffer(self.codes)])
+        return pa.DictionaryArray.from_arrays(indices, pa.array(self.values, type=pa.string()))
+
+    def to_objects(self) -> np.ndarray:
+        values = np.array(self.values, dtype=object)
+        return values[np.frombuffer(self.codes, dtype=np.int32)]
+
+
+class ListingBatch:
+    """
+    Lote columnar de publicaciones.
+
+    En lugar de un dict por publicación, cada columna se guarda en un array
+    tipado (enteros y floats) o en un pool de strings internados (moneda y
+    ubicación), y se convierte a DataFrame o tabla Arrow sin copiar los
+    datos numéricos. Una vez convertido, el lote no admite más filas.
+    """
+
+    __slots__ = ('ids', 'prices', 'meters', 'titles', 'currencies', 'locations', 'images', 'links')
+
+    def __init__(self):
+        self.ids = array('q')
+        self.prices = array('q')
+        self.meters = array('d')
+        self.titles: List[str] = []
+        self.currencies = _StringPool()
+        self.locations = _StringPool()
+        self.images: List[str] = []
+        self.links: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def append(self, listing_id: int, title: str, currency: str, price: int,
+               location: str, meters: Optional[float], image: str, link: str):
+        self.ids.append(listing_id)
+        self.titles.append(title)
+        self.currencies.append(currency)
+        self.prices.append(price)
+        self.locations.append(location)
+        self.meters.append(meters or 0.0)
+        self.images.append(image)
+        self.links.append(strip_tracking_params(link))
+
+    def to_arrow(self) -> pa.Table:
+        """Tabla Arrow que comparte los buffers numéricos del lote"""
+        n = len(self)
+        return pa.table({
+            'ID': pa.Array.from_buffers(pa.int64(), n, [None, pa.py_buffer(self.ids)]),
+            'title': pa.array(self.titles, type=pa.string()),
+            'currency': self.currencies.to_arrow(),
+            'price': pa.Array.from_buffers(pa.int64(), n, [None, pa.py_buffer(self.prices)]),
+            'location': self.locations.to_arrow(),
+            'meters': pa.Array.from_buffers(pa.float64(), n, [None, pa.py_buffer(self.meters)]),
+            'image': pa.array(self.images, type=pa.string()),
+            'links': pa.array(self.links, type=pa.string()),
+        })
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """DataFrame cuyas columnas numéricas son vistas de los arrays del lote"""
+        return pd.DataFrame({
+            'ID': np.frombuffer(self.ids, dtype=np.int64),
+            'title': np.array(self.titles, dtype=object),
+            'currency': self.currencies.to_objects(),
+            'price': np.frombuffer(self.prices, dtype=np.int64),
+            'location': self.locations.to_objects(),
+            'meters': np.frombuffer(self.meters, dtype=np.float64),
+            'image': np.array(self.images, dtype=object),
+            'links': np.array(self.links, dtype=object),
+        }, columns=COLUMNS, copy=False)
@@ -0,0 +1,184 @@
+import base64
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+import requests
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+THUMBNAILS_DIR = "thumbnails"
+
+# Tamaño con el que se muestran las imágenes en la tabla de resultados
+THUMBNAIL_SIZE = (150, 100)
+
+
+class ThumbnailCache:
+    """
+    Proxy local de miniaturas.
+
+    Descarga cada imagen una sola vez, la achica al tamaño con que se muestra
+    y la guarda como JPEG en un directorio con tamaño máximo; cuando se
+    supera, se borran las miniaturas usadas hace más tiempo (LRU).
+
+    Las descargas se hacen en un pool en segundo plano: mientras una
+    miniatura no está generada se usa la imagen original, y las URLs que
+    fallan no se reintentan hasta pasado `retry_after`.
+    """
+
+    def __init__(self, cache_dir: str = THUMBNAILS_DIR, max_bytes: int = 50 * 1024 * 1024,
+                 size: Tuple[int, int] = THUMBNAIL_SIZE, max_workers: int = 8, timeout: float = 10.0,
+                 retry_after: float = 3600.0):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.size = size
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='miniaturas')
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        })
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> tamaño en bytes, del menos al más usado
+        self._total_bytes = 0
+        self._pending = set()
+        self._failed: Dict[str, float] = {}  # url -> momento del último error
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_entries()
+
+    def _load_entries(self):
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith('.jpg'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.jpg")
+
+    def get(self, url: str) -> Optional[bytes]:
+        """Retorna la miniatura guardada para una URL o None"""
+        key = self._key(url)
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+            os.utime(self._path(key))
+            return data
+        except OSError:
+            with self._lock:
+                self._total_bytes -= self._entries.pop(key, 0)
+            return None
+
+    def _store(self, url: str, data: bytes):
+        key = self._key(url)
+        path = self._path(key)
+        # Nombre temporal único: dos descargas de la misma URL pueden
+        # terminar a la vez
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            evicted = []
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    def resize(self, data: bytes) -> bytes:
+        """Achica una imagen al tamaño de la miniatura y la codifica como JPEG"""
+        with Image.open(io.BytesIO(data)) as img:
+            img = img.convert('RGB')
+            img.thumbnail(self.size)
+            output = io.BytesIO()
+            img.save(output, format='JPEG', quality=80, optimize=True)
+            return output.getvalue()
+
+    def _recently_failed(self, url: str) -> bool:
+        failed_at = self._failed.get(url)
+        return failed_at is not None and time.monotonic() - failed_at < self.retry_after
+
+    def fetch(self, url: str) -> Optional[bytes]:
+        """Retorna la miniatura de una URL, descargándola si no está en cache"""
+        cached = self.get(url)
+        if cached is not None:
+            return cached
+        if self._recently_failed(url):
+            return None
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            thumbnail = self.resize(response.content)
+        except (requests.RequestException, OSError) as e:
+            logger.warning(f"Error generando miniatura de {url}: {e}")
+            with self._lock:
+                self._failed[url] = time.monotonic()
+            return None
+        self._store(url, thumbnail)
+        return thumbnail
+
+    def _fetch_pending(self, url: str):
+        try:
+            self.fetch(url)
+        finally:
+            with self._lock:
+                self._pending.discard(url)
+
+    def get_many(self, urls: Iterable[str]) -> Dict[str, bytes]:
+        """
+        Retorna las miniaturas ya generadas de varias URLs y encola en el
+        pool las que faltan, sin esperar a que se descarguen
+        """
+        result = {}
+        missing = []
+        for url in dict.fromkeys(u for u in urls if u and not u.startswith('data:')):
+            cached = self.get(url)
+            if cached is not None:
+                result[url] = cached
+            else:
+                missing.append(url)
+
+        queued = 0
+        for url in missing:
+            with self._lock:
+                if url in self._pending or self._recently_failed(url):
+                    continue
+                self._pending.add(url)
+            self.executor.submit(self._fetch_pending, url)
+            queued += 1
+        if queued:
+            logger.info(f"Miniaturas encoladas: {queued} de {len(missing)} faltantes")
+        return result
+
+
+def thumbnail_data_uri(thumbnail: bytes) -> str:
+    """Codifica una miniatura JPEG como data URI para incrustarla en el HTML"""
+    return f"data:image/jpeg;base64,{base64.b64encode(thumbnail).decode('ascii')}"
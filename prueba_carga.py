@@ -0,0 +1,150 @@
+import argparse
+import pickle
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import pandas as pd
+import pyarrow as pa
+
+from datos_compartidos import SharedDataset, clean_data, load_listings
+from geocodificacion import Geocoder
+from snapshot import build_snapshot, load_snapshot
+
+logging.basicConfig(level=logging.WARNING)
+
+
+def random_filters(rng: random.Random) -> Dict:
+    """Filtros al azar, como los que elegiría un usuario en el sidebar"""
+    low = rng.choice([0, 50000, 100000, 200000])
+    return {
+        'price_range': (low, low + rng.choice([100000, 300000, 10 ** 9])),
+        'meters_range': (0, rng.choice([80, 150, 10 ** 6])),
+        'include_no_meters': rng.random() < 0.7,
+        'location': rng.choice(['', '', 'palermo', 'belgrano', 'caballito', 'pilar']),
+    }
+
+
+def session_with_copies(raw: pd.DataFrame, filters: Dict):
+    """
+    Sesión con el esquema anterior: st.cache_data entrega una copia
+    (pickle) por sesión, clean_data vuelve a copiar y se filtra con pandas
+    """
+    df = pickle.loads(pickle.dumps(raw))
+    df = clean_data(df)
+    low, high = filters['price_range']
+    df_filtered = df[(df['price'] >= low) & (df['price'] <= high)]
+    in_range = (df_filtered['meters'] >= filters['meters_range'][0]) & (df_filtered['meters'] <= filters['meters_range'][1])
+    if filters['include_no_meters']:
+        df_filtered = df_filtered[in_range | (df_filtered['meters'] == 0)]
+    else:
+        df_filtered = df_filtered[in_range & (df_filtered['meters'] > 0)]
+    if filters['location']:
+        df_filtered = df_filtered[df_filtered['location'].str.contains(filters['location'], case=False, na=False)]
+    display_df = df_filtered.copy()
+    # La sesión conserva su DataFrame mientras está abierta
+    return df, display_df
+
+
+def session_shared(dataset: SharedDataset, filters: Dict):
+    """Sesión con el dataset compartido: posiciones filtradas y vista"""
+    positions = dataset.filter(
+        dataset.currencies[0],
+        filters['price_range'],
+        filters['meters_range'],
+        include_no_meters=filters['include_no_meters'],
+        location=filters['location'],
+        group_duplicates=False,
+    )
+    return positions, dataset.view(positions)
+
+
+def run_sessions(name: str, session: Callable, users: int, seed: int = 42) -> Dict:
+    """Ejecuta `users` sesiones concurrentes y mide latencia y memoria"""
+    rng = random.Random(seed)
+    filters = [random_filters(rng) for _ in range(users)]
+    latencies: List[float] = []
+
+    def timed(f: Dict):
+        start = time.perf_counter()
+        result = session(f)
+        latencies.append(time.perf_counter() - start)
+        return result
+
+    # tracemalloc no ve el pool de memoria de Arrow (buffers de take(), etc.),
+    # así que se mide aparte
+    arrow_before = pa.total_allocated_bytes()
+    tracemalloc.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        # Los resultados se conservan hasta el final, como sesiones abiertas
+        results = list(executor.map(timed, filters))
+    total = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    arrow_retained = pa.total_allocated_bytes() - arrow_before
+    del results
+
+    latencies.sort()
+    return {
+        'modo': name,
+        'usuarios': users,
+        'memoria Python (MB)': current / 1024 ** 2,
+        'memoria Arrow (MB)': arrow_retained / 1024 ** 2,
+        'memoria retenida (MB)': (current + arrow_retained) / 1024 ** 2,
+        'memoria pico Python (MB)': peak / 1024 ** 2,
+        'latencia p50 (ms)': statistics.median(latencies) * 1000,
+        'latencia p95 (ms)': latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+        'total (s)': total,
+    }
+
+
+def main():
+    """
+    Prueba de carga: compara memoria y latencia de N sesiones simultáneas
+    con copias por sesión contra el dataset compartido
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--file', default="inmuebles_200000-800000_output.csv")
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--scale', type=int, default=20,
+                        help="veces que se replica el CSV para simular un dataset más grande")
+    args = parser.parse_args()
+
+    raw = load_listings(args.file)
+    if raw is None:
+        print(f"❌ No se encontró {args.file}")
+        return
+    raw = pd.concat([raw] * args.scale, ignore_index=True)
+    print(f"📊 {len(raw)} filas, {args.users} usuarios simultáneos\n")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_file = f"{tmp_dir}/inmuebles_prueba_output.csv"
+        raw.to_csv(csv_file, index=False)
+
+        # El snapshot se genera en el build y cada proceso solo lo abre
+        # (fuera de la medición por sesión, igual que st.cache_resource)
+        build_start = time.perf_counter()
+        build_snapshot(csv_file, tmp_dir, geocoder=Geocoder(cache_file=None))
+        build_time = time.perf_counter() - build_start
+
+        load_start = time.perf_counter()
+        dataset = SharedDataset(load_snapshot(csv_file, tmp_dir))
+        load_time = time.perf_counter() - load_start
+
+        results = [
+            run_sessions("copias por sesión", lambda f: session_with_copies(raw, f), args.users),
+            run_sessions("dataset compartido", lambda f: session_shared(dataset, f), args.users),
+        ]
+    print(pd.DataFrame(results).round(1).to_string(index=False))
+    print(f"\nGeneración del snapshot (una vez, en el build): {build_time:.1f} s")
+    print(f"Apertura del dataset compartido (una vez por proceso): {load_time * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import requests
+from bs4 import BeautifulSoup
+import re
+import time
+import threading
+import logging
+from typing import Optional
+from urllib.parse import urljoin
+from lote_inmuebles import ListingBatch
+
+logger = logging.getLogger(__name__)
+
+class RateLimiter:
+    """
+    Token bucket thread-safe: limita los requests por segundo compartidos
+    entre el scraping de listados y la consulta de páginas de detalle
+    """
+    
+    def __init__(self, rate: float = 8.0, burst: int = 8):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Bloquea hasta que haya un token disponible"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+class MercadoLibreInmueblesScraper:
+    """Scraper optimizado para inmuebles de MercadoLibre Argentina"""
+    
+    def __init__(self, min_price: str = "200000", max_price: str = "800000", delay: float = 1.0,
+                 rate_limiter: Optional[RateLimiter] = None):
+        self.min_price = min_price
+        self.max_price = max_price
+        self.delay = delay
+        self.base_url = "https://inmuebles.mercadolibre.com.ar"
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        })
+        
+    def get_soup(self, url: str) -> Optional[BeautifulSoup]:
+        self.rate_limiter.acquire()
+        try:
+            response = self.session.get(url, timeout=10)
+            response.raise_for_status()
+            return BeautifulSoup(response.text, 'html.parser')
+        except requests.RequestException as e:
+            logger.error(f"Error al obtener la página {url}: {e}")
+            return None
+    
+    def extract_meters(self, item) -> Optional[float]:
+        """
+        Extrae los metros cuadrados del inmueble
+        """
+        try:
+            # Buscar en los atributos de la lista
+            attributes = item.find_all('li', {'class': 'poly-attributes-list__bar'})
+            for attr in attributes:
+                text = attr.get_text(strip=True)
+                if 'm² cubiertos' in text or 'm²' in text:
+                    meters_match = re.search(r'(\d+(?:\.\d+)?)', text)
+                    if meters_match:
+                        return float(meters_match.group(1))
+            
+            # Buscar en otros posibles contenedores
+            attributes_alt = item.find_all('li', {'class': 'poly-attributes_list__item'})
+            for attr in attributes_alt:
+                text = attr.get_text(strip=True)
+                if 'm²' in text:
+                    meters_match = re.search(r'(\d+(?:\.\d+)?)', text)
+                    if meters_match:
+                        return float(meters_match.group(1))
+                        
+        except Exception as e:
+            logger.warning(f"Error extrayendo metros: {e}")
+        
+        return None
+    
+    def extract_product_data(self, item, index: int, batch: ListingBatch) -> bool:
+        """Extrae los datos de un producto y los agrega al lote"""
+        try:
+            # Título
+            title_elem = item.find('h3', {'class': 'poly-component__title-wrapper'})
+            if not title_elem:
+                title_elem = item.find('h2', {'class': 'poly-component__title'})
+            title = title_elem.get_text(strip=True) if title_elem else "Sin título"
+            
+            # Moneda
+            currency_elem = item.find('span', {'class': 'andes-money-amount__currency-symbol'})
+            currency = currency_elem.get_text(strip=True) if currency_elem else "USD"
+            
+            # Precio
+            price_elem = item.find('span', {'class': 'andes-money-amount__fraction'})
+            price = 0
+            if price_elem:
+                price_text = price_elem.get_text(strip=True).replace('.', '').replace(',', '')
+                try:
+                    price = int(price_text)
+                except ValueError:
+                    price = 0
+            
+            # Ubicación
+            location_elem = item.find('span', {'class': 'poly-component__location'})
+            location = location_elem.get_text(strip=True) if location_elem else "Sin ubicación"
+            
+            # Metros cuadrados
+            meters = self.extract_meters(item)
+            
+            # Imagen
+            img = item.find('img')
+            image_url = ""
+            if img:
+                image_url = img.get('data-src') or img.get('src') or ""
+            
+            # Link
+            link_elem = item.find('a')
+            link = ""
+            if link_elem and link_elem.get('href'):
+                link = urljoin(self.base_url, link_elem['href'])
+            
+            batch.append(index, title, currency, price, location, meters, image_url, link)
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error extrayendo datos del producto {index}: {e}")
+            return False
+    
+    def scrape_page(self, url: str, start_index: int, batch: ListingBatch) -> int:
+        """Agrega al lote los productos de una página y retorna cuántos agregó"""
+        soup = self.get_soup(url)
+        
+        if not soup:
+            return 0
+            
+        results = soup.find_all('div', {'class': 'andes-card'})
+        
+        added = 0
+        for i, item in enumerate(results):
+            if self.extract_product_data(item, start_index + i + 1, batch):
+                added += 1
+        
+        return added
+    
+    def run_scraper(self, max_pages: int = 10) -> ListingBatch:
+        """Ejecuta el scraping y retorna un lote columnar de productos"""
+        batch = ListingBatch()
+        
+        # Primera página
+        url = f"{self.base_url}/venta/_PriceRange_{self.min_price}USD-{self.max_price}USD"
+        self.scrape_page(url, 0, batch)
+        
+        # Páginas adicionales
+        for page in range(1, max_pages):
+            offset = page * 48
+            url = f"{self.base_url}/venta/_Desde_{offset + 1}_PriceRange_{self.min_price}USD-{self.max_price}USD"
+            added = self.scrape_page(url, len(batch), batch)
+            
+            if not added:
+                break
+                
+            time.sleep(self.delay)
+        
+        return batch
@@ -0,0 +1,141 @@
+import glob
+import os
+import logging
+from typing import TYPE_CHECKING, List, Optional
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.ipc as ipc
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from geocodificacion import Geocoder
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = "snapshots"
+CSV_PATTERN = "inmuebles_*_output.csv"
+
+# Se incrementa cuando cambia el contenido del snapshot; los snapshots de
+# otra versión se regeneran
+SNAPSHOT_VERSION = b"2"
+_VERSION_KEY = b"wishhouse_snapshot_version"
+
+# Tipos de las columnas del snapshot (las columnas ausentes se ignoran)
+COLUMN_TYPES = {
+    'ID': pa.int64(),
+    'title': pa.string(),
+    'currency': pa.string(),
+    'price': pa.float64(),
+    'location': pa.string(),
+    'meters': pa.float64(),
+    'image': pa.string(),
+    'links': pa.string(),
+}
+
+# Columnas calculadas al generar el snapshot (ver prepare_listings)
+PREPARED_TYPES = {
+    'lat': pa.float64(),
+    'lon': pa.float64(),
+    'geo_precision': pa.string(),
+    'canonical': pa.bool_(),
+    'sources': pa.list_(pa.string()),
+    'duplicates': pa.int64(),
+}
+
+
+def snapshot_path(csv_file: str, snapshot_dir: str = SNAPSHOT_DIR) -> str:
+    """Ruta del snapshot Arrow correspondiente a un CSV"""
+    name = os.path.splitext(os.path.basename(csv_file))[0]
+    return os.path.join(snapshot_dir, f"{name}.arrow")
+
+
+def listings_table(frame: 'pd.DataFrame') -> pa.Table:
+    """
+    Convierte los datos ya preparados a una tabla Arrow de un solo chunk,
+    con la moneda codificada como diccionario
+    """
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    for name, column_type in PREPARED_TYPES.items():
+        if name in table.column_names:
+            index = table.schema.get_field_index(name)
+            table = table.set_column(index, name, table.column(name).cast(column_type))
+    index = table.schema.get_field_index('currency')
+    table = table.set_column(index, 'currency', table.column('currency').dictionary_encode())
+    table = table.combine_chunks()
+    return table.replace_schema_metadata({_VERSION_KEY: SNAPSHOT_VERSION})
+
+
+def build_snapshot(csv_file: str, snapshot_dir: str = SNAPSHOT_DIR,
+                   geocoder: Optional['Geocoder'] = None) -> str:
+    """
+    Convierte un CSV de inmuebles a un archivo Arrow IPC sin comprimir, que
+    se puede abrir con memory-map al iniciar la aplicación.
+
+    La limpieza, la geocodificación y la agrupación de duplicados se hacen
+    acá, en el build, y quedan guardadas como columnas del snapshot.
+    """
+    # Import diferido: datos_compartidos importa este módulo
+    from datos_compartidos import prepare_listings
+
+    os.makedirs(snapshot_dir, exist_ok=True)
+    raw = pa_csv.read_csv(
+        csv_file,
+        convert_options=pa_csv.ConvertOptions(column_types=COLUMN_TYPES),
+    )
+    table = listings_table(prepare_listings(raw.to_pandas(), geocoder))
+    output = snapshot_path(csv_file, snapshot_dir)
+    tmp_output = f"{output}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_output, 'wb') as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_output, output)
+    logger.info(f"Snapshot generado: {output} ({table.num_rows} filas)")
+    return output
+
+
+def load_snapshot(csv_file: str, snapshot_dir: str = SNAPSHOT_DIR) -> Optional[pa.Table]:
+    """
+    Abre con memory-map el snapshot de un CSV si existe y no está
+    desactualizado respecto del CSV
+    """
+    path = snapshot_path(csv_file, snapshot_dir)
+    if not os.path.exists(path):
+        return None
+    if os.path.exists(csv_file) and os.path.getmtime(csv_file) > os.path.getmtime(path):
+        logger.info(f"Snapshot desactualizado: {path}")
+        return None
+    try:
+        source = pa.memory_map(path, 'r')
+        table = ipc.open_file(source).read_all()
+    except (OSError, pa.ArrowInvalid) as e:
+        logger.warning(f"Error leyendo snapshot {path}: {e}")
+        return None
+    if (table.schema.metadata or {}).get(_VERSION_KEY) != SNAPSHOT_VERSION:
+        logger.info(f"Snapshot de otra versión: {path}")
+        return None
+    return table
+
+
+def build_all_snapshots(pattern: str = CSV_PATTERN, snapshot_dir: str = SNAPSHOT_DIR) -> List[str]:
+    """Genera los snapshots de todos los CSV de inmuebles"""
+    outputs = []
+    for csv_file in sorted(glob.glob(pattern)):
+        try:
+            outputs.append(build_snapshot(csv_file, snapshot_dir))
+        except (OSError, pa.ArrowInvalid) as e:
+            logger.error(f"Error generando snapshot de {csv_file}: {e}")
+    return outputs
+
+
+def main():
+    """
+    Función principal, pensada para ejecutarse en el build (bin/post_compile)
+    """
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    outputs = build_all_snapshots()
+    print(f"✅ {len(outputs)} snapshots generados en {SNAPSHOT_DIR}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import json
+import random
+
+import pandas as pd
+
+from busquedas_guardadas import FileOutbox, SavedSearch, SavedSearchMatcher
+from geocodificacion import Geocoder
+
+SAMPLE_CSV = "inmuebles_10000-200000_output.csv"
+
+
+def _matcher(tmp_path, geocoder=None):
+    return SavedSearchMatcher(searches_file=None, outbox=FileOutbox(str(tmp_path / "outbox.jsonl")),
+                              geocoder=geocoder)
+
+
+def test_candidates_cover_brute_force_matches(tmp_path):
+    listings = pd.read_csv(SAMPLE_CSV).to_dict('records')
+    matcher = _matcher(tmp_path)
+    rng = random.Random(1)
+    locations = ['', 'palerm', 'Belgrano', 'nuñez', 'ti', 'tigre', 'pilar', 'villa urquiza', 'zona norte']
+    for i in range(500):
+        low = rng.choice([0, 50000, 100000])
+        matcher.add(SavedSearch(
+            f"búsqueda {i}",
+            currency=rng.choice([None, 'US$']),
+            min_price=low,
+            max_price=low + rng.choice([50000, 150000]),
+            min_meters=rng.choice([0, 40]),
+            max_meters=rng.choice([80, 300]),
+            include_no_meters=rng.random() < 0.5,
+            location=rng.choice(locations),
+        ))
+
+    for listing in listings:
+        expected = {s.search_id for s in matcher.searches.values() if s.matches(listing)}
+        assert expected <= matcher.candidates(listing)
+
+
+def test_location_matches_substring(tmp_path):
+    matcher = _matcher(tmp_path)
+    matcher.add(SavedSearch("palermo", location="Palerm"))
+    listing = {'links': 'https://x/MLA-1', 'title': 'Depto', 'currency': 'US$', 'price': 100000,
+               'meters': 50, 'location': 'Gorriti 4000, Palermo, Capital Federal'}
+
+    matches = matcher.process(pd.DataFrame([listing]))
+
+    assert len(matches) == 1
+    with open(tmp_path / "outbox.jsonl", encoding='utf-8') as f:
+        record = json.loads(f.readline())
+    assert record['search_name'] == "palermo"
+    # Una publicación se notifica una sola vez
+    assert matcher.process(pd.DataFrame([listing])) == []
+
+
+def test_near_filter_is_applied(tmp_path):
+    geocoder = Geocoder(cache_file=None, streets_file=None)
+    matcher = _matcher(tmp_path, geocoder)
+    lat, lon, _ = geocoder.geocode("Belgrano, Capital Federal")
+    matcher.add(SavedSearch("cerca de belgrano", near_lat=lat, near_lon=lon, radius_km=3.0))
+    listings = pd.DataFrame([
+        {'links': 'https://x/MLA-1', 'title': 'Depto', 'currency': 'US$', 'price': 100000,
+         'meters': 50, 'location': 'Cabildo 1000, Belgrano, Capital Federal'},
+        {'links': 'https://x/MLA-2', 'title': 'Casa', 'currency': 'US$', 'price': 100000,
+         'meters': 50, 'location': 'Centro, Pilar'},
+    ])
+
+    matches = matcher.process(listings)
+
+    assert [listing['links'] for _, listing in matches] == ['https://x/MLA-1']
+
+
+def test_search_round_trip_keeps_near():
+    search = SavedSearch("x", near_lat=-34.56, near_lon=-58.45, radius_km=2.0)
+    restored = SavedSearch.from_dict(json.loads(json.dumps(search.to_dict())))
+    assert (restored.near_lat, restored.near_lon, restored.radius_km) == (-34.56, -58.45, 2.0)
+    assert SavedSearch.from_dict({'name': 'vieja', 'search_id': 'abc'}).has_near is False
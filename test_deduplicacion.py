@@ -0,0 +1,36 @@
+import pandas as pd
+
+from deduplicacion import ListingDeduplicator, deduplicate_dataframe, price_bucket
+
+
+def _listing(price, link="", currency='US$'):
+    return {
+        'title': 'Departamento 3 ambientes con balcón',
+        'location': 'Cabildo 1000, Belgrano, Capital Federal',
+        'currency': currency,
+        'price': price,
+        'meters': 70,
+        'links': link,
+    }
+
+
+def test_prices_within_tolerance_fall_in_contiguous_buckets():
+    assert abs(price_bucket(100000) - price_bucket(105262)) <= 1
+
+
+def test_prices_within_tolerance_are_clustered():
+    assert ListingDeduplicator().cluster([_listing(100000), _listing(105262)]) == [[0, 1]]
+
+
+def test_different_currency_is_not_clustered():
+    assert len(ListingDeduplicator().cluster([_listing(100000), _listing(100000, currency='$')])) == 2
+
+
+def test_sources_ignore_tracking_params():
+    df = pd.DataFrame([
+        _listing(100000, 'https://departamento.mercadolibre.com.ar/MLA-1-depto-_JM#position=1'),
+        _listing(100000, 'https://departamento.mercadolibre.com.ar/MLA-1-depto-_JM#position=7'),
+    ])
+    result = deduplicate_dataframe(df)
+    assert len(result) == 1
+    assert len(result['sources'].iloc[0]) == 1
@@ -0,0 +1,51 @@
+import pytest
+
+from enriquecimiento import DetailEnricher, _to_number, parse_detail_text
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('95', 95.0),
+    ('95,5', 95.5),
+    ('1.200', 1200.0),
+    ('1.250.000', 1250000.0),
+    ('1.250,50', 1250.5),
+    ('1,250.50', 1250.5),
+    ('72.5', 72.5),
+])
+def test_to_number_separators(text, expected):
+    assert _to_number(text) == expected
+
+
+def test_parse_detail_text_table_rows():
+    details = parse_detail_text(
+        'Superficie total = 1.250,50 m² Superficie cubierta = 95,5 m² Ambientes = 3 Dormitorios = 2'
+    )
+    assert details == {
+        'covered_meters': 95.5,
+        'total_meters': 1250.5,
+        'ambientes': 3.0,
+        'dormitorios': 2.0,
+    }
+
+
+def test_parse_detail_text_highlighted_specs():
+    details = parse_detail_text('1.200 m² totales 80 m² cubiertos 4 amb. 3 dormitorios')
+    assert details['total_meters'] == 1200.0
+    assert details['covered_meters'] == 80.0
+    assert details['ambientes'] == 4.0
+    assert details['dormitorios'] == 3.0
+
+
+def test_parse_detail_text_ambiguous_number_is_skipped():
+    details = parse_detail_text('Superficie total = 1,250,50 m²')
+    assert details['total_meters'] is None
+
+
+class _FailingScraper:
+    def get_soup(self, url):
+        raise RuntimeError("página rota")
+
+
+def test_fetch_details_error_returns_none():
+    enricher = DetailEnricher(_FailingScraper(), cache_file=None)
+    assert enricher.fetch_details('https://example.com/MLA-1') is None